@@ -0,0 +1,290 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Async access to Db2 for i from ASGI code.
+
+Each worker of an AsyncDatabase is a thread holding its own connection, so
+independent queries awaited together run concurrently instead of queueing
+for the single thread sync_to_async uses:
+
+    db = AsyncDatabase('default', max_workers=8)
+
+    async def view(request):
+        orders, stock = await asyncio.gather(
+            db.run(lambda: list(Order.objects.filter(open=True))),
+            db.run(lambda: Stock.objects.aggregate(Sum('qty'))),
+        )
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT ... WHERE id = %s", [pk])
+            row = await cursor.fetchone()
+        async with db.iterate(Order.objects.all()) as orders:
+            async for order in orders:
+                ...
+
+A cursor or an iteration leases a worker until it is closed or exhausted,
+so everything it does runs on one thread and one connection. Iterations
+left early should be closed, which `async with` takes care of. An
+AsyncDatabase can be shared by several event loops; await aclose() to shut
+it down from one of them.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class AsyncDatabase:
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, max_workers=4):
+        self.using = using
+        self.max_workers = max_workers
+        self._workers = [ThreadPoolExecutor(max_workers=1) for i in range(max_workers)]
+        self._free = deque(self._workers)
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def cursor(self):
+        return AsyncCursor(self)
+
+    # Calls func(*args) on a free worker, where it can use the ORM as usual.
+    async def run(self, func, *args, **kwargs):
+        worker = await self._lease()
+        try:
+            return await self._call(worker, func, *args, **kwargs)
+        finally:
+            self._release(worker)
+
+    # Returns an async iterator over the results of queryset, fetched
+    # chunk_size rows at a time on a single worker.
+    def iterate(self, queryset, chunk_size=100):
+        return AsyncQuerysetIterator(self, queryset, chunk_size)
+
+    # Closes the worker connections and stops the threads. This blocks until
+    # every worker is idle, so code running on an event loop should await
+    # aclose() instead.
+    def close(self):
+        for worker in self._workers:
+            worker.submit(self._close_connection).result()
+            worker.shutdown()
+
+    async def aclose(self):
+        await asyncio.get_event_loop().run_in_executor(None, self.close)
+
+    async def _lease(self):
+        worker = await self._take()
+        try:
+            await self._call(worker, self._check_connection)
+        except BaseException:
+            self._release(worker)
+            raise
+        return worker
+
+    # Free workers are shared by every event loop using this database, so a
+    # worker is handed to a waiting lease on the loop that lease runs on.
+    async def _take(self):
+        with self._lock:
+            if self._free:
+                return self._free.popleft()
+            loop = asyncio.get_event_loop()
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, waiter) in self._waiters:
+                    self._waiters.remove((loop, waiter))
+            raise
+
+    def _release(self, worker):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, waiter, worker)
+                except RuntimeError:
+                    # The loop of this waiter has been closed.
+                    continue
+                return
+            self._free.append(worker)
+
+    def _hand_over(self, waiter, worker):
+        if waiter.done():
+            self._release(worker)
+        else:
+            waiter.set_result(worker)
+
+    def _call(self, worker, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(worker, functools.partial(func, *args, **kwargs))
+
+    # Worker connections outlive requests, so they are checked the way Django
+    # checks persistent connections at the start of each request.
+    def _check_connection(self):
+        connections[self.using].close_if_unusable_or_obsolete()
+
+    def _close_connection(self):
+        connections[self.using].close()
+
+
+class AsyncQuerysetIterator:
+
+    """
+    Async iterator over the results of a queryset, holding a worker of its
+    AsyncDatabase from the first row until it is exhausted or closed.
+    """
+
+    def __init__(self, database, queryset, chunk_size):
+        self.database = database
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+        self._worker = None
+        self._rows = None
+        self._chunk = deque()
+        self._done = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._chunk:
+            if self._done:
+                raise StopAsyncIteration
+            try:
+                await self._fetch()
+            except BaseException:
+                await self.close()
+                raise
+        return self._chunk.popleft()
+
+    async def _fetch(self):
+        if self._worker is None:
+            self._worker = await self.database._lease()
+            self._rows = await self.database._call(
+                self._worker, lambda: iter(self.queryset.iterator(self.chunk_size)))
+        chunk = await self.database._call(self._worker, _take, self._rows, self.chunk_size)
+        self._chunk.extend(chunk)
+        if len(chunk) < self.chunk_size:
+            await self.close()
+
+    async def close(self):
+        self._done = True
+        if self._worker is None:
+            return
+        worker, rows = self._worker, self._rows
+        self._worker = self._rows = None
+        try:
+            if rows is not None:
+                await self.database._call(worker, rows.close)
+        finally:
+            self.database._release(worker)
+
+
+def _take(rows, count):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == count:
+            break
+    return chunk
+
+
+class AsyncCursor:
+
+    """
+    Awaitable counterpart of a database cursor, holding a worker of its
+    AsyncDatabase from the time it is opened until it is closed.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self._worker = None
+        self._cursor = None
+        self._rows = deque()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        self._worker = await self.database._lease()
+        try:
+            self._cursor = await self._call(lambda: connections[self.database.using].cursor())
+        except BaseException:
+            self.database._release(self._worker)
+            self._worker = None
+            raise
+
+    async def close(self):
+        if self._worker is None:
+            return
+        try:
+            await self._call(self._cursor.close)
+        finally:
+            self.database._release(self._worker)
+            self._worker = self._cursor = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    async def execute(self, sql, params=None):
+        return await self._call(self._cursor.execute, sql, params)
+
+    async def executemany(self, sql, param_list):
+        return await self._call(self._cursor.executemany, sql, param_list)
+
+    async def fetchone(self):
+        return await self._call(self._cursor.fetchone)
+
+    async def fetchmany(self, size=100):
+        return await self._call(self._cursor.fetchmany, size)
+
+    async def fetchall(self):
+        return await self._call(self._cursor.fetchall)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._rows:
+            self._rows.extend(await self.fetchmany())
+            if not self._rows:
+                raise StopAsyncIteration
+        return self._rows.popleft()
+
+    def _call(self, func, *args):
+        if self._worker is None:
+            raise RuntimeError("The cursor is not open")
+        return self.database._call(self._worker, func, *args)
@@ -0,0 +1,136 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Streaming export of result sets as Apache Arrow record batches. pyarrow is
+optional and only needed when these functions are used.
+
+    export_queryset(Order.objects.filter(year=2020), 'orders.parquet')
+
+or through the export_arrow management command.
+"""
+import datetime
+import decimal
+
+from django.conf import settings
+from django.db import connections
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Rows per record batch when the cursor does not suggest a size.
+BATCH_SIZE = 65536
+
+# Db2 for i pads some character data with NUL characters.
+_nul_translation = str.maketrans('', '', '\x00')
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("pyarrow is required for Arrow exports")
+
+
+# Arrow type of a column of cursor.description. DECIMAL keeps its precision
+# and scale; timestamps are UTC when USE_TZ is set, which is how the backend
+# stores them.
+def arrow_type(desc):
+    type_code, precision, scale = desc[1], desc[4], desc[5]
+    if type_code is bool:
+        return pyarrow.bool_()
+    if type_code is int:
+        return pyarrow.int64()
+    if type_code is float:
+        return pyarrow.float64()
+    if type_code is decimal.Decimal:
+        if precision and precision > 38:
+            return pyarrow.decimal256(precision, scale or 0)
+        return pyarrow.decimal128(precision or 38, scale or 0)
+    if type_code is datetime.datetime:
+        return pyarrow.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+    if type_code is datetime.date:
+        return pyarrow.date32()
+    if type_code is datetime.time:
+        return pyarrow.time64('us')
+    if type_code in (bytes, bytearray):
+        return pyarrow.binary()
+    return pyarrow.string()
+
+
+def arrow_schema(description, names=None):
+    _require_pyarrow()
+    names = names or [desc[0].lower() for desc in description]
+    return pyarrow.schema([
+        pyarrow.field(name, arrow_type(desc), nullable=bool(desc[6]) if desc[6] is not None else True)
+        for name, desc in zip(names, description)
+    ])
+
+
+# Yields the rest of the result set of cursor as record batches of at most
+# batch_size rows. Only one batch of rows is held in memory at a time.
+def record_batches(cursor, schema, batch_size=BATCH_SIZE):
+    _require_pyarrow()
+    string_columns = [index for index, field in enumerate(schema) if pyarrow.types.is_string(field.type)]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        columns = [list(values) for values in zip(*rows)]
+        for index in string_columns:
+            columns[index] = [value.translate(_nul_translation) if isinstance(value, str) else value
+                              for value in columns[index]]
+        yield pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema)
+
+
+# Runs queryset, restricted to fields when given, on a server-side cursor
+# and calls consume(schema, batches) with the schema of the result and an
+# iterator of its record batches.
+def stream_queryset(queryset, consume, *fields, batch_size=BATCH_SIZE):
+    _require_pyarrow()
+    if fields:
+        queryset = queryset.values_list(*fields)
+    compiler = queryset.query.get_compiler(queryset.db)
+    sql, params = compiler.as_sql()
+    connection = connections[queryset.db]
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        schema = arrow_schema(cursor.description, list(fields) or None)
+        # The raw pyodbc cursor, as the batches do their own conversions
+        raw_cursor = getattr(cursor.cursor, 'cursor', cursor.cursor)
+        return consume(schema, record_batches(raw_cursor, schema, batch_size))
+
+
+# Writes queryset to path as Parquet, or as an Arrow IPC file when format is
+# 'arrow'. Returns the number of rows written.
+def export_queryset(queryset, path, *fields, format='parquet', batch_size=BATCH_SIZE):
+    def consume(schema, batches):
+        rows = 0
+        if format == 'parquet':
+            import pyarrow.parquet
+            writer = pyarrow.parquet.ParquetWriter(path, schema)
+        else:
+            import pyarrow.ipc
+            writer = pyarrow.ipc.new_file(path, schema)
+        with writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        return rows
+    return stream_queryset(queryset, consume, *fields, batch_size=batch_size)
@@ -20,10 +20,6 @@
 DB2 database backend for Django.
 Requires: pyodbc
 """
-from distutils import util
-
-from django.core.exceptions import ImproperlyConfigured
-
 try:
     from django.db.backends import BaseDatabaseWrapper
 except ImportError:
@@ -41,17 +37,24 @@ from .creation import DatabaseCreation
 from .introspection import DatabaseIntrospection
 from .operations import DatabaseOperations
 from .features import DatabaseFeatures
+from .pool import connection_pool
+from . import options
+from .columnar import ARRAY_BLOCK_SIZE, fetch_arrays
+from .utils import IntrospectionCache, LRUCache, StatementCache
 
 import pyodbc
 
 from .schemaEditor import DB2SchemaEditor
 
 import datetime
+import re
+import time
 from django.db import utils
 from django.utils import timezone
 from django.conf import settings
 import warnings
-import re
+from collections import namedtuple
+from contextlib import contextmanager
 
 DatabaseError = pyodbc.DatabaseError
 IntegrityError = pyodbc.IntegrityError
@@ -64,7 +67,62 @@ ProgrammingError = pyodbc.ProgrammingError
 NotSupportedError = pyodbc.NotSupportedError
 
 
-dbms_name = 'dbms_name'
+# Default ceiling, in bytes, for the rows a chunked cursor holds per fetch.
+CHUNKED_FETCH_MEMORY = 16 * 1024 * 1024
+
+# Default lifetime, in seconds, of cached catalog metadata. Metadata is only
+# cached while a schema editor is open unless the OPTION says otherwise, as
+# other connections can change the catalog at any time.
+INTROSPECTION_CACHE_TTL = 0
+
+# Approximate memory used by each fetched value on top of its data.
+ROW_VALUE_OVERHEAD = 64
+
+# Seconds for which a successful statement or probe vouches for a connection.
+USABLE_CHECK_INTERVAL = 10
+
+# SQLSTATEs reporting that the connection to the server is gone.
+DISCONNECT_SQLSTATE_CLASSES = ('08', )
+DISCONNECT_SQLSTATES = {'40003', 'HYT01'}
+
+# Result of translating a format style statement to qmark style, along with
+# the flags execute needs: whether the statement is an ALTER TABLE (and may
+# leave tables reorg pending) and whether regex parameters must be inlined.
+TranslatedSQL = namedtuple('TranslatedSQL', ['sql', 'alter_table', 'regex_inline'])
+
+# Per-process cache of translated statements keyed by the incoming SQL text,
+# shared by DB2CursorWrapper.execute and executemany. The ORM issues the same
+# statements over and over, so the string work is done once per statement.
+# Statements longer than TRANSLATION_CACHE_MAX_SQL characters, such as
+# multi-row bulk inserts, are translated every time rather than kept.
+sql_translation_cache = LRUCache(maxsize=1024)
+TRANSLATION_CACHE_MAX_SQL = 8 * 1024
+
+# Statements changing a setting of the session: the schema unqualified names
+# resolve to, the library list (which any procedure can change, QCMDEXC with
+# CHGLIBL or ADDLIBLE included) and the isolation level.
+session_change_res = (
+    ('schema', re.compile(r'^\s*SET\s+(?:CURRENT\s+)?SCHEMA\b', re.I)),
+    ('library_list', re.compile(r'^\s*CALL\s', re.I)),
+    ('isolation', re.compile(r'^\s*SET\s+(?:CURRENT\s+ISOLATION|TRANSACTION\s+ISOLATION)\b', re.I)),
+)
+
+
+def translate_sql(operation):
+    cacheable = len(operation) <= TRANSLATION_CACHE_MAX_SQL
+    translated = sql_translation_cache.get(operation) if cacheable else None
+    if translated is None:
+        sql = operation
+        regex_inline = "db2regexExtraField(%s)" in sql
+        if regex_inline:
+            # Parameters get inlined, so the rest has to wait for them.
+            sql = sql.replace("db2regexExtraField(%s)", "")
+        elif "%s" in sql:
+            sql = sql % (tuple("?" * sql.count("%s")))
+        translated = TranslatedSQL(sql, sql.startswith('ALTER TABLE'), regex_inline)
+        if cacheable:
+            sql_translation_cache.put(operation, translated)
+    return translated
 
 
 class DatabaseValidation(BaseDatabaseValidation):
@@ -115,7 +173,11 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         self.data_types = self.creation.data_types
         self.data_type_check_constraints = self.creation.data_type_check_constraints
         self.introspection = DatabaseIntrospection(self)
+        ttl = self.settings_dict.get('OPTIONS', {}).get('introspection_cache_ttl', INTROSPECTION_CACHE_TTL)
+        self.introspection_cache = IntrospectionCache(ttl)
         self.validation = DatabaseValidation(self)
+        # Schema editor holding ALTER TABLE clauses back, if any
+        self.alter_batch = None
         self.databaseWrapper = DatabaseWrapper()
 
     # Method to check if connection is live or not.
@@ -124,67 +186,68 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
     # To get dict of connection parameters
     def get_connection_params(self):
-        settings_dict = self.settings_dict
-        if 'NAME' not in settings_dict:
-            raise ImproperlyConfigured(
-                "settings.DATABASES is improperly configured. "
-                "Please supply the NAME value.")
-        conn_params = {
-            'system': settings_dict['NAME']
-        }
-        if 'USER' in settings_dict:
-            conn_params['user'] = settings_dict['USER']
-        if 'PASSWORD' in settings_dict:
-            conn_params['password'] = settings_dict['PASSWORD']
-
-        if 'OPTIONS' in settings_dict:
-            conn_params.update(settings_dict['OPTIONS'])
-
-        allowed_opts = {'system', 'user', 'password', 'autocommit',
-                        'readonly',
-                        'timeout', 'database', 'use_system_naming',
-                        'library_list', 'current_schema'
-                        }
-
-        if not allowed_opts.issuperset(conn_params.keys()):
-            raise ValueError("Option entered not valid for "
-                             "IBM i Access ODBC Driver")
-
-        try:
-            conn_params['Naming'] = \
-                str(util.strtobool(conn_params['use_system_naming']))
-        except (ValueError, KeyError):
-            conn_params['Naming'] = '0'
-
-        if 'current_schema' in conn_params or 'library_list' in conn_params:
-            conn_params['DefaultLibraries'] = \
-                conn_params.pop('current_schema', '') + ','
-            library_list = conn_params.pop('library_list', '')
-            if isinstance(library_list, str):
-                conn_params['DefaultLibraries'] += library_list
-            else:
-                conn_params['DefaultLibraries'] += ','.join(library_list)
-
-        return conn_params
+        return options.get_connection_params(self.settings_dict)
 
-    # To get new connection from Database
+    # To get new connection from Database, or from the pool when one is configured
     def get_new_connection(self, conn_params):
-        return pyodbc.connect("Driver=IBM i Access ODBC Driver; UNICODESQL=1; TRUEAUTOCOMMIT=1;", **conn_params)
-
+        def connect():
+            return pyodbc.connect(options.DRIVER, **conn_params)
+        pool = connection_pool(self)
+        if pool is None:
+            return connect()
+        return pool.acquire(connect)
+
+    # A named cursor is a chunked cursor used by QuerySet.iterator(); it
+    # streams the result set in blocks bounded by chunked_fetch_memory.
+    # ALTER TABLE clauses a schema editor holds back are sent before any
+    # cursor is opened, so that nothing sees the tables unaltered.
     def create_cursor(self, name=None):
+        if self.alter_batch is not None:
+            self.alter_batch.flush_alters()
         cursor = self.connection.cursor()
-        return DB2CursorWrapper(cursor, self.connection)
+        if name is None:
+            return DB2CursorWrapper(cursor, self.connection, health=self.health,
+                                    statements=self.statements,
+                                    on_session_change=self._session_changed)
+        fetch_memory = self.settings_dict.get('OPTIONS', {}).get(
+            'chunked_fetch_memory', CHUNKED_FETCH_MEMORY)
+        return DB2CursorWrapper(cursor, self.connection, chunked=True,
+                                fetch_memory=int(fetch_memory), health=self.health,
+                                statements=self.statements,
+                                on_session_change=self._session_changed)
+
+    # Called by cursors with the session setting a statement changed, which
+    # a pooled connection has to get back when it is returned.
+    def _session_changed(self, setting):
+        if setting == 'schema':
+            self.introspection.forget_current_schema()
+        pool = connection_pool(self)
+        if pool is not None:
+            pool.changed(self.connection, setting)
+
+    def chunked_cursor(self):
+        return self._cursor(name='chunked')
 
     def init_connection_state(self):
-        pass
+        interval = self.settings_dict.get('OPTIONS', {}).get('usable_check_interval', USABLE_CHECK_INTERVAL)
+        self.health = ConnectionHealth(self.connection, interval)
+        # A new or pooled connection may start out in a different schema
+        self.introspection.forget_current_schema()
+        # Opt-in cache of prepared statements, sized by statement_cache_size.
+        # A pooled connection keeps its cache from one checkout to the next.
+        cache_size = self.settings_dict.get('OPTIONS', {}).get('statement_cache_size')
+        pool = connection_pool(self)
+        if not cache_size:
+            self.statements = None
+        elif pool is not None:
+            self.statements = pool.statement_cache(self.connection, int(cache_size))
+        else:
+            self.statements = StatementCache(self.connection, int(cache_size))
 
+    # Trusts a connection that completed a statement within the last
+    # usable_check_interval seconds, and only probes the server otherwise.
     def is_usable(self):
-        try:
-            # If connection is closed and unusable, a Programming error will result
-            self.connection.cursor()
-        except pyodbc.ProgrammingError:
-            return False
-        return True
+        return self.health.is_usable()
 
     def _set_autocommit(self, autocommit):
         with self.wrap_database_errors:
@@ -193,19 +256,69 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     def close(self):
         if self.connection is not None:
             self.validate_thread_sharing()
-            self.connection.close()
+            pool = connection_pool(self)
+            if pool is None:
+                self.connection.close()
+            else:
+                pool.release(self.connection)
             self.connection = None
 
     def get_server_version(self):
         if not self.connection:
-            self.cursor()
+            self.ensure_connection()
+        # The driver reports the release as e.g. "07.04.0015"
         return tuple(int(version) for version in
-                     self.connection.server_info()[1].split("."))
+                     self.connection.getinfo(pyodbc.SQL_DBMS_VER).split("."))
+
+    def get_dbms_name(self):
+        if not self.connection:
+            self.ensure_connection()
+        # "DB2/400 SQL" for Db2 for i, "DB2/<platform>" for Db2 for LUW
+        return self.connection.getinfo(pyodbc.SQL_DBMS_NAME)
 
     def schema_editor(self, *args, **kwargs):
         return DB2SchemaEditor(self, *args, **kwargs)
 
 
+class ConnectionHealth:
+
+    """
+    What is known about one physical connection: when it last completed a
+    statement, and whether a statement failed with a communication error.
+    """
+
+    def __init__(self, connection, interval=USABLE_CHECK_INTERVAL):
+        self.connection = connection
+        self.interval = interval
+        self.broken = False
+        self.last_success = None
+        self._probe_cursor = None
+
+    def succeeded(self):
+        self.last_success = time.monotonic()
+
+    def failed(self, error):
+        sqlstate = error.args[0] if error.args else ''
+        if sqlstate[:2] in DISCONNECT_SQLSTATE_CLASSES or sqlstate in DISCONNECT_SQLSTATES:
+            self.broken = True
+
+    def is_usable(self):
+        if self.broken:
+            return False
+        if self.last_success is not None and time.monotonic() - self.last_success < self.interval:
+            return True
+        # The probe cursor is kept so the driver reuses the prepared statement
+        try:
+            if self._probe_cursor is None:
+                self._probe_cursor = self.connection.cursor()
+            self._probe_cursor.execute("VALUES 1").fetchall()
+        except pyodbc.Error as e:
+            self.failed(e)
+            return False
+        self.succeeded()
+        return True
+
+
 class DB2CursorWrapper:
     """
     This is the wrapper around pyodbc in order to support format parameter style
@@ -213,19 +326,47 @@ class DB2CursorWrapper:
     hence this conversion is required.
     """
 
-    def __init__(self, cursor, conn):
+    def __init__(self, cursor, conn, chunked=False, fetch_memory=CHUNKED_FETCH_MEMORY, health=None,
+                 statements=None, on_session_change=None):
         self.cursor = cursor
         self.conn = conn
+        self.health = health
+        self.statements = statements
+        self.on_session_change = on_session_change
+        self._own_cursor = cursor
+        self._statement = None
+        self.chunked = chunked
+        self.fetch_memory = fetch_memory
+        self._row_plan = None
+        self._fetch_limit = None
 
     def __getattr__(self, attr):
         return getattr(self.cursor, attr)
 
     def __iter__(self):
+        if self.chunked:
+            return (row for rows in self.iter_chunks() for row in rows)
         return iter(self.cursor)
 
     def __next__(self):
         return next(self.cursor)
 
+    def close(self):
+        self._use_cursor(None)
+        self.cursor.close()
+
+    # With a statement cache, statements are executed on the connection's
+    # cached cursor for their SQL, which still has it prepared. Everything
+    # else, and every statement without a cache, uses the wrapper's own cursor.
+    def _use_cursor(self, operation):
+        if self._statement is not None:
+            self.statements.checkin(*self._statement)
+            self._statement = None
+        self.cursor = self._own_cursor
+        if operation is not None and self.statements is not None:
+            self.cursor = self.statements.checkout(operation)
+            self._statement = (operation, self.cursor)
+
     def _format_parameters(self, parameters):
         parameters = list(parameters)
         for index in range(len(parameters)):
@@ -247,22 +388,26 @@ class DB2CursorWrapper:
     # Over-riding this method to modify SQLs which contains format parameter
     # to qmark.
     def execute(self, operation, parameters=()):
-        operation = str(operation)
         try:
-
-            doReorg = 1 if operation.find('ALTER TABLE') == 0 and getattr(self.connection, dbms_name) != 'DB2' else 0
-            if operation.count("db2regexExtraField(%s)") > 0:
-                operation = operation.replace("db2regexExtraField(%s)", "")
+            operation, alter_table, regex_inline = translate_sql(str(operation))
+            if regex_inline:
                 operation = operation % parameters
                 parameters = ()
-            if operation.count("%s") > 0:
-                operation = operation % (tuple("?" * operation.count("%s")))
+                if operation.count("%s") > 0:
+                    operation = operation % (tuple("?" * operation.count("%s")))
             parameters = self._format_parameters(parameters)
+            self._row_plan = None
+            self._fetch_limit = None
+            self._use_cursor(None if alter_table or regex_inline else operation)
 
             try:
                 result = self.cursor.execute(operation, parameters)
-                if doReorg == 1:
-                    return self._reorg_tables()
+                if self.health is not None:
+                    self.health.succeeded()
+                if self.on_session_change is not None:
+                    for setting, setting_re in session_change_res:
+                        if setting_re.match(operation):
+                            self.on_session_change(setting)
             except IntegrityError as e:
                 raise utils.IntegrityError(*e.args) from e
 
@@ -270,6 +415,8 @@ class DB2CursorWrapper:
                 raise utils.ProgrammingError(*e.args) from e
 
             except DatabaseError as e:
+                if self.health is not None:
+                    self.health.failed(e)
                 raise utils.DatabaseError(*e.args) from e
 
         except TypeError:
@@ -278,39 +425,42 @@ class DB2CursorWrapper:
     # Over-riding this method to modify SQLs which contains format parameter to qmark.
     def executemany(self, operation, seq_parameters):
         try:
-            if operation.count("db2regexExtraField(%s)") > 0:
+            operation, alter_table, regex_inline = translate_sql(str(operation))
+            if regex_inline:
                 raise ValueError("Regex not supported in this operation")
-            if operation.count("%s") > 0:
-                operation = operation % (tuple("?" * operation.count("%s")))
 
             seq_parameters = [self._format_parameters(parameters) for
                               parameters in seq_parameters]
+            self._row_plan = None
+            self._fetch_limit = None
+            self._use_cursor(None)
             try:
-                return self.cursor.executemany(operation, seq_parameters)
+                result = self.cursor.executemany(operation, seq_parameters)
+                if self.health is not None:
+                    self.health.succeeded()
+                return result
             except IntegrityError as e:
                 raise utils.IntegrityError(*e.args) from e
 
             except DatabaseError as e:
+                if self.health is not None:
+                    self.health.failed(e)
                 raise utils.DatabaseError(*e.args) from e
 
         except (IndexError, TypeError):
             return None
 
-    # table reorganization method
-    def _reorg_tables(self):
-        checkReorgSQL = "select TABSCHEMA, TABNAME from SYSIBMADM.ADMINTABINFO where REORG_PENDING = 'Y'"
-        res = []
-        reorgSQLs = []
-        parameters = ()
-        self.cursor.execute(checkReorgSQL, parameters)
-        res = self.cursor.fetchall()
-        if res:
-            for sName, tName in res:
-                reorgSQL = '''CALL SYSPROC.ADMIN_CMD('REORG TABLE "%(sName)s"."%(tName)s"')''' % {
-                    'sName': sName, 'tName': tName}
-                reorgSQLs.append(reorgSQL)
-            for sql in reorgSQLs:
-                self.cursor.execute(sql)
+    # Switches the driver to array-bound parameters for the executemany
+    # calls made inside the block.
+    @contextmanager
+    def fast_executemany_mode(self):
+        self._use_cursor(None)
+        previous = self.cursor.fast_executemany
+        self.cursor.fast_executemany = True
+        try:
+            yield self
+        finally:
+            self.cursor.fast_executemany = previous
 
     # Over-riding this method to modify result set containing datetime and time zone support is active
     def fetchone(self):
@@ -318,35 +468,95 @@ class DB2CursorWrapper:
         if row is None:
             return row
         else:
-            return self._fix_return_data(row)
+            return self._fix_return_data(row, self._get_row_plan())
 
     # Over-riding this method to modify result set containing datetime and time zone support is active
     def fetchmany(self, size=0):
+        if self.chunked:
+            size = min(size or self.cursor.arraysize, self._get_fetch_limit())
         rows = self.cursor.fetchmany(size)
         if rows is None:
             return rows
-        else:
-            return [self._fix_return_data(row) for row in rows]
+        plan = self._get_row_plan()
+        if not plan:
+            return rows
+        return [self._fix_return_data(row, plan) for row in rows]
 
     # Over-riding this method to modify result set containing datetime and time zone support is active
     def fetchall(self):
         rows = self.cursor.fetchall()
         if rows is None:
             return rows
-        else:
-            return [self._fix_return_data(row) for row in rows]
+        plan = self._get_row_plan()
+        if not plan:
+            return rows
+        return [self._fix_return_data(row, plan) for row in rows]
+
+    # Reads the rest of the result set into one NumPy array per column,
+    # bypassing the per-row conversions of the fetch methods.
+    def fetch_arrays(self, block_size=None):
+        return fetch_arrays(self.cursor, block_size or min(self._get_fetch_limit(), ARRAY_BLOCK_SIZE))
+
+    # Generator yielding the rest of the result set in blocks of at most
+    # size rows, without ever materialising the whole result set.
+    def iter_chunks(self, size=None):
+        while True:
+            rows = self.fetchmany(size or self._get_fetch_limit())
+            if not rows:
+                return
+            yield rows
+
+    def nextset(self):
+        self._row_plan = None
+        self._fetch_limit = None
+        return self.cursor.nextset()
+
+    # Returns how many rows of the current result set fit in fetch_memory,
+    # estimating the width of a row from the column sizes in
+    # cursor.description plus the per value overhead of a Python object.
+    def _get_fetch_limit(self):
+        if self._fetch_limit is None:
+            row_size = sum((desc[3] or 0) + ROW_VALUE_OVERHEAD
+                           for desc in self.cursor.description or ())
+            self._fetch_limit = max(1, self.fetch_memory // max(row_size, 1))
+        return self._fetch_limit
+
+    # Returns the converter plan of the current result set, building it from
+    # cursor.description on first use. Only DATETIME columns (when time zone
+    # support is active) and character columns get a converter.
+    def _get_row_plan(self):
+        if self._row_plan is None:
+            plan = []
+            for index, desc in enumerate(self.cursor.description or ()):
+                if desc[1] == pyodbc.DATETIME:
+                    if settings.USE_TZ:
+                        plan.append((index, _make_utc_aware))
+                elif desc[1] == str:
+                    plan.append((index, _strip_nul))
+            self._row_plan = tuple(plan)
+        return self._row_plan
 
     # This method to modify result set containing datetime and time zone support is active
-    def _fix_return_data(self, row):
+    def _fix_return_data(self, row, plan):
+        if not plan:
+            return row
         row = list(row)
-        index = -1
-        for value, desc in zip(row, self.cursor.description):
-            index = index + 1
-            if (desc[1] == pyodbc.DATETIME):
-                if settings.USE_TZ and value is not None and timezone.is_naive(
-                        value):
-                    value = value.replace(tzinfo=timezone.utc)
-                    row[index] = value
-            if isinstance(value, str):
-                row[index] = re.sub(r'[\x00]', '', value)
+        for index, convert in plan:
+            value = row[index]
+            if value is not None:
+                row[index] = convert(value)
         return tuple(row)
+
+
+# Db2 for i pads some character data with NUL characters.
+_nul_translation = str.maketrans('', '', '\x00')
+
+
+def _strip_nul(value):
+    return value.translate(_nul_translation)
+
+
+def _make_utc_aware(value):
+    if timezone.is_naive(value):
+        return value.replace(tzinfo=timezone.utc)
+    return value
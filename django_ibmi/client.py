@@ -19,66 +19,28 @@
 """
 This module implements command line interface for DB2 through Django.
 """
-from distutils import util
-
 import pyodbc
-from django.core.exceptions import ImproperlyConfigured
 
 try:
     from django.db.backends import BaseDatabaseClient
 except ImportError:
     from django.db.backends.base.client import BaseDatabaseClient
 import os
+import subprocess
+
+from . import options
 
 
 class DatabaseClient(BaseDatabaseClient):
 
     # Over-riding base method to provide shell support for DB2 through Django.
-    def runshell(self):
-        settings_dict = self.connection.settings_dict
-        if 'NAME' not in settings_dict:
-            raise ImproperlyConfigured(
-                "settings.DATABASES is improperly configured. "
-                "Please supply the NAME value.")
-
-        conn_params = {
-            'system': settings_dict['NAME']
-        }
-        if 'USER' in settings_dict:
-            conn_params['user'] = settings_dict['USER']
-
-        if 'PASSWORD' in settings_dict:
-            conn_params['password'] = settings_dict['PASSWORD']
-
-        if 'OPTIONS' in settings_dict:
-            conn_params.update(settings_dict['OPTIONS'])
-
-        allowed_opts = {'system', 'user', 'password', 'autocommit', 'readonly','timeout', 'database', 'use_system_naming',
-                        'library_list', 'current_schema'
-                        }
-
-        if not allowed_opts.issuperset(conn_params.keys()):
-            raise ValueError("Option entered not valid for "
-                             "IBM i Access ODBC Driver")
-
-        try:
-            conn_params['Naming'] = \
-                str(util.strtobool(conn_params['use_system_naming']))
-        except (ValueError, KeyError):
-            conn_params['Naming'] = '0'
-
-        if 'current_schema' in conn_params or 'library_list' in conn_params:
-            conn_params['DefaultLibraries'] = \
-                conn_params.pop('current_schema', '') + ','
-            if isinstance(conn_params["DefaultLibraries"], str):
-                conn_params['DefaultLibraries'] += \
-                    conn_params.pop('library_list', '')
-            else:
-                conn_params['DefaultLibraries'] += ','.join(
-                    conn_params.pop('library_list', ''))
+    # Django 3.1 passes the arguments given after -- to dbshell as
+    # parameters; they are handed on to isql.
+    def runshell(self, parameters=None):
+        conn_params = options.get_connection_params(self.connection.settings_dict)
 
         if os.name == 'nt':
-            cnxn = pyodbc.connect("Driver=IBM i Access ODBC Driver; UNICODESQL=1; TRUEAUTOCOMMIT=1;", **conn_params)
+            cnxn = pyodbc.connect(options.DRIVER, **conn_params)
             cursor = cnxn.cursor()
             while True:
                 try:
@@ -103,9 +65,9 @@ class DatabaseClient(BaseDatabaseClient):
             cnxn.close()
 
         else:
-            args = ['%s -v -k "DRIVER=IBM i Access ODBC Driver; UNICODESQL=1; TRUEAUTOCOMMIT=1; SYSTEM=%s; UID=%s; PWD=%s"' %
-                    ('isql', settings_dict['NAME'], settings_dict['USER'], settings_dict['PASSWORD'])]
+            args = ['isql', '-v', '-k', options.connection_string(conn_params)]
+            args.extend(parameters or ())
             try:
-                os.subprocess.call(args, shell=True)
+                subprocess.call(args)
             except KeyboardInterrupt:
                 pass
@@ -0,0 +1,142 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Columnar fetch of result sets into NumPy arrays. numpy is optional and only
+needed when these functions are used.
+
+    arrays = queryset_arrays(Reading.objects.filter(day__gte=start), 'sensor_id', 'taken', 'value')
+    arrays['value'].mean()
+
+Columns holding NULLs come back as numpy.ma.MaskedArray. Values are the
+raw database values: DECIMAL columns become float64, timestamps naive
+datetime64[us] (UTC when USE_TZ is set, as stored) and BooleanFields 0/1.
+"""
+from collections import OrderedDict
+import datetime
+import decimal
+
+from django.db import connections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Rows read per block when the cursor does not suggest a size.
+ARRAY_BLOCK_SIZE = 10000
+
+# NumPy dtypes of the Python types pyodbc reports in cursor.description.
+# Everything else is kept in object arrays.
+_dtypes = {
+    bool: 'bool',
+    int: 'int64',
+    float: 'float64',
+    decimal.Decimal: 'float64',
+    datetime.datetime: 'datetime64[us]',
+    datetime.date: 'datetime64[D]',
+}
+
+# Stand-ins written to the data of masked positions.
+_fill_values = {
+    'bool': False,
+    'int64': 0,
+    'float64': 0.0,
+    'datetime64[us]': None,
+    'datetime64[D]': None,
+}
+
+# Db2 for i pads some character data with NUL characters.
+_nul_translation = str.maketrans('', '', '\x00')
+
+
+class _Column:
+
+    def __init__(self, type_code, capacity):
+        self.dtype = _dtypes.get(type_code, 'object')
+        self.strip_nul = type_code is str
+        self.data = numpy.empty(capacity, dtype=self.dtype)
+        self.mask = None
+
+    def grow(self, capacity):
+        self.data = _resized(self.data, capacity)
+        if self.mask is not None:
+            self.mask = _resized(self.mask, capacity)
+
+    def fill(self, start, values):
+        end = start + len(values)
+        if None in values:
+            if self.mask is None:
+                self.mask = numpy.zeros(len(self.data), dtype=bool)
+            self.mask[start:end] = [value is None for value in values]
+            if self.dtype != 'object':
+                fill_value = _fill_values[self.dtype]
+                values = [fill_value if value is None else value for value in values]
+        if self.strip_nul:
+            values = [value.translate(_nul_translation) if value is not None else None for value in values]
+        self.data[start:end] = values
+
+    def result(self, size):
+        data = self.data[:size]
+        if self.mask is None:
+            return data
+        return numpy.ma.MaskedArray(data, mask=self.mask[:size])
+
+
+def _resized(array, capacity):
+    resized = numpy.zeros(capacity, dtype=array.dtype)
+    resized[:len(array)] = array
+    return resized
+
+
+# Reads the rest of the result set of a pyodbc cursor block by block into
+# a list of arrays, one per column in result set order. Column names are
+# not unique across joins, so they are left for the caller to attach.
+def fetch_arrays(cursor, block_size=ARRAY_BLOCK_SIZE):
+    if numpy is None:
+        raise ImportError("numpy is required for columnar fetches")
+    description = cursor.description
+    capacity = block_size
+    columns = [_Column(desc[1], capacity) for desc in description]
+    size = 0
+    while True:
+        rows = cursor.fetchmany(block_size)
+        if not rows:
+            break
+        if size + len(rows) > capacity:
+            capacity = max(capacity * 2, size + len(rows))
+            for column in columns:
+                column.grow(capacity)
+        for column, values in zip(columns, zip(*rows)):
+            column.fill(size, values)
+        size += len(rows)
+    return [column.result(size) for column in columns]
+
+
+# Runs queryset, restricted to fields when given, and returns its columns as
+# arrays keyed by field name (by attname of every concrete field without
+# fields).
+def queryset_arrays(queryset, *fields, block_size=None):
+    if not fields:
+        fields = [field.attname for field in queryset.model._meta.concrete_fields]
+    queryset = queryset.values_list(*fields)
+    compiler = queryset.query.get_compiler(queryset.db)
+    sql, params = compiler.as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        arrays = cursor.cursor.fetch_arrays(block_size)
+    return OrderedDict(zip(fields, arrays))
@@ -16,14 +16,139 @@
 # | Authors: Ambrish Bhargava, Tarun Pasrija, Rahul Priyadarshi              |
 # +--------------------------------------------------------------------------+
 
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.signals import post_init
 from django.db.models.sql import compiler
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
 from itertools import zip_longest
+import threading
+import weakref
+
+from .fields import LazyLobMixin
+from .operations import lob_field_types
+
+
+# Number of primary keys per query when a batch of deferred LOBs is loaded.
+LOB_BATCH_SIZE = 1000
+
+# The batch the instances currently being built from a result set join.
+_current = threading.local()
+
+
+class LobBatch:
+
+    """
+    The instances built from one result set whose LOB columns were deferred.
+    The first access to a deferred LOB of any of them loads it for all of
+    them with one query.
+    """
+
+    def __init__(self, model, using):
+        self.model = model
+        self.using = using
+        self.expected_pk = None
+        self._instances = []
+
+    # Instances are pickled without their batch; they load LOBs one by one.
+    def __reduce__(self):
+        return LobBatch, (self.model, self.using)
+
+    def add(self, instance):
+        self._instances.append(weakref.ref(instance))
+        instance.__dict__['_lob_batch'] = self
+
+    def load(self, attname):
+        instances = {}
+        for ref in self._instances:
+            instance = ref()
+            if instance is not None and attname not in instance.__dict__:
+                instances.setdefault(instance.pk, []).append(instance)
+        pks = list(instances)
+        manager = self.model._base_manager.using(self.using)
+        for start in range(0, len(pks), LOB_BATCH_SIZE):
+            rows = manager.filter(pk__in=pks[start:start + LOB_BATCH_SIZE]).values_list('pk', attname)
+            for pk, value in rows:
+                for instance in instances.get(pk, ()):
+                    instance.__dict__[attname] = value
+
+
+class BatchedLobAttribute(DeferredAttribute):
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        if self.field.attname not in instance.__dict__:
+            batch = instance.__dict__.get('_lob_batch')
+            if batch is not None:
+                batch.load(self.field.attname)
+        return super().__get__(instance, cls)
+
+
+def _join_lob_batch(sender, instance, **kwargs):
+    batch = getattr(_current, 'batch', None)
+    if batch is not None and batch.expected_pk is not None and isinstance(instance, batch.model) \
+            and instance.pk == batch.expected_pk:
+        batch.expected_pk = None
+        batch.add(instance)
+
+
+# LOB fields of model which DEFER_LOB_COLUMNS leaves out of default selects.
+# Their descriptors are replaced so deferred values are loaded in batches.
+def deferrable_lob_fields(model):
+    fields = [field for field in model._meta.concrete_fields
+              if field.get_internal_type() in lob_field_types and not field.primary_key
+              and not isinstance(field, LazyLobMixin)]
+    for field in fields:
+        if type(getattr(model, field.attname, None)) is DeferredAttribute:
+            setattr(model, field.attname, BatchedLobAttribute(field))
+            post_init.connect(_join_lob_batch, sender=model, weak=False,
+                              dispatch_uid='django_ibmi.compiler.lob_batch')
+    return fields
+
+
+def _batched_rows(rows, batch, pk_index):
+    previous = getattr(_current, 'batch', None)
+    try:
+        for row in rows:
+            _current.batch = batch
+            batch.expected_pk = row[pk_index]
+            yield row
+    finally:
+        _current.batch = previous
 
 
 class SQLCompiler(compiler.SQLCompiler):
     __rownum = 'Z.__ROWNUM'
+    _lob_batch = None
+
+    # With DEFER_LOB_COLUMNS set, LOB columns of the queried model are left
+    # out of the default columns unless the query names its fields with
+    # only(); they are loaded on first access, for the whole result at once.
+    def deferred_to_columns(self):
+        columns = super().deferred_to_columns()
+        if not self.connection.settings_dict.get('DEFER_LOB_COLUMNS') or not self.query.deferred_loading[1]:
+            return columns
+        model = self.query.get_meta().concrete_model
+        lob_fields = deferrable_lob_fields(model)
+        if lob_fields:
+            loaded = columns.get(model) or {field.attname for field in model._meta.concrete_fields}
+            columns[model] = loaded - {field.attname for field in lob_fields}
+            self._lob_batch = LobBatch(model, self.using)
+        return columns
+
+    def results_iter(self, results=None, tuple_expected=False, chunked_fetch=False,
+                     chunk_size=GET_ITERATOR_CHUNK_SIZE):
+        rows = super().results_iter(results, tuple_expected, chunked_fetch, chunk_size)
+        if self._lob_batch is None:
+            return rows
+        pk = self.query.get_meta().concrete_model._meta.pk
+        for index, (expression, sql, alias) in enumerate(self.select):
+            if getattr(expression, 'target', None) is pk:
+                return _batched_rows(rows, self._lob_batch, index)
+        return rows
 
     # To get ride of LIMIT/OFFSET problem in DB2, this method has been implemented.
+    # Releases without OFFSET/FETCH support fall back to a ROW_NUMBER() wrapper.
     def as_sql(self, with_limits=True, with_col_aliases=False, subquery=False):
         self.subquery = subquery
         self.__do_filter(self.query.where.children)
@@ -45,8 +170,20 @@ class SQLCompiler(compiler.SQLCompiler):
             if self.query.high_mark == self.query.low_mark:
                 return '', ()
             sql_ori, params = super().as_sql(False, with_col_aliases)
+            # The locking clause of select_for_update() has to follow the
+            # paging and optimize clauses.
+            lock_sql = self.__lock_sql(sql_ori)
+            if lock_sql:
+                sql_ori = sql_ori[:-len(lock_sql)]
+            if self.connection.features.supports_offset_fetch:
+                sql = "%s %s" % (sql_ori, self.connection.ops.limit_offset_sql(
+                    self.query.low_mark, self.query.high_mark))
+                # The optimize clause is only allowed on the outermost select
+                if self.query.high_mark is not None and not (self.subquery or self.query.subquery):
+                    sql = "%s OPTIMIZE FOR %d ROWS" % (sql, self.query.high_mark - self.query.low_mark)
+                return sql + lock_sql, params
             if self.query.low_mark == 0:
-                return sql_ori + " FETCH FIRST %s ROWS ONLY" % self.query.high_mark, params
+                return sql_ori + " FETCH FIRST %s ROWS ONLY" % self.query.high_mark + lock_sql, params
             sql_split = sql_ori.split(" FROM ")
             sql_sec = ""
             if len(sql_split) > 2:
@@ -106,7 +243,14 @@ class SQLCompiler(compiler.SQLCompiler):
                 sql = '%s "%s" <= %d' % (
                     sql, self.__rownum, self.query.high_mark)
 
-        return sql, params
+        return sql + lock_sql, params
+
+    # Returns the locking clause Django appended to sql, if any.
+    def __lock_sql(self, sql):
+        if not self.query.select_for_update:
+            return ''
+        lock_sql = ' ' + self.connection.ops.for_update_sql()
+        return lock_sql if sql.endswith(lock_sql) else ''
 
     # This function  convert 0/1 to boolean type for BooleanField/NullBooleanField
     def resolve_columns(self, row, fields=()):
@@ -137,7 +281,59 @@ class SQLCompiler(compiler.SQLCompiler):
 
 
 class SQLInsertCompiler(compiler.SQLInsertCompiler, SQLCompiler):
-    pass
+
+    # Wrap the insert in a FINAL TABLE select so identity values and other
+    # database generated columns come back in the same round trip.
+    def as_sql(self):
+        result = super().as_sql()
+        returning_fields = self._returning_fields()
+        if returning_fields and self.connection.features.can_return_columns_from_insert:
+            qn = self.connection.ops.quote_name
+            columns = ', '.join(qn(field.column) for field in returning_fields)
+            order_by = " ORDER BY INPUT SEQUENCE" if len(self.query.objs) > 1 else ""
+            result = [("SELECT %s FROM FINAL TABLE (%s)%s" % (columns, sql, order_by), params)
+                      for sql, params in result]
+        return result
+
+    # Django 2.2 asks for the primary key with return_id instead of naming
+    # returning_fields.
+    def _returning_fields(self):
+        if getattr(self, 'return_id', False):
+            return [self.query.get_meta().pk]
+        return getattr(self, 'returning_fields', None)
+
+    # Django 2.2 passes return_id, a bool, where later releases pass
+    # returning_fields; either is handed on to Django unchanged.
+    def execute_sql(self, returning_fields=None):
+        if not returning_fields and not self.query.ignore_conflicts and \
+                self.connection.ops.bulk_insert_use_executemany(self.query.fields, self.query.objs):
+            sql_and_params = self.as_executemany_sql()
+            if sql_and_params is not None:
+                self.returning_fields = None
+                with self.connection.cursor() as cursor:
+                    with cursor.fast_executemany_mode():
+                        cursor.executemany(*sql_and_params)
+                return []
+        return super().execute_sql(returning_fields)
+
+    # Returns a single-row INSERT and the parameters of every object, or None
+    # when the rows do not share one placeholder shape (e.g. expressions).
+    def as_executemany_sql(self):
+        qn = self.connection.ops.quote_name
+        opts = self.query.get_meta()
+        fields = self.query.fields
+        value_rows = [
+            [self.prepare_value(field, self.pre_save_val(field, obj)) for field in fields]
+            for obj in self.query.objs
+        ]
+        placeholder_rows, param_rows = self.assemble_as_sql(fields, value_rows)
+        if any(row != placeholder_rows[0] for row in placeholder_rows):
+            return None
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            qn(opts.db_table),
+            ', '.join(qn(f.column) for f in fields),
+            ', '.join(placeholder_rows[0]))
+        return sql, param_rows
 
 
 class SQLDeleteCompiler(compiler.SQLDeleteCompiler, SQLCompiler):
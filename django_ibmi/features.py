@@ -1,4 +1,5 @@
 from django.db.backends.base.features import BaseDatabaseFeatures
+from django.utils.functional import cached_property
 
 
 class DatabaseFeatures(BaseDatabaseFeatures):
@@ -24,8 +25,16 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     requires_rollback_on_dirty_transaction = True
     supports_regex_backreferencing = True
     supports_timezones = False
-    has_bulk_insert = False
+    has_bulk_insert = True
+    # Db2 for i accepts at most 32767 parameter markers in one statement
+    max_query_params = 32767
     has_select_for_update = True
+    # Inserts are wrapped in SELECT ... FROM FINAL TABLE (INSERT ...)
+    can_return_columns_from_insert = True
+    can_return_rows_from_bulk_insert = True
+    # The same for Django 2.2
+    can_return_id_from_insert = True
+    can_return_ids_from_bulk_insert = True
     supports_long_model_names = False
     can_distinct_on_fields = False
     supports_paramstyle_pyformat = False
@@ -40,3 +49,21 @@ class DatabaseFeatures(BaseDatabaseFeatures):
     can_introspect_null = True
     can_introspect_ip_address_field = False
     can_introspect_time_field = True
+
+    # OFFSET n ROWS / FETCH NEXT n ROWS ONLY is available from IBM i 7.2 on;
+    # older releases page with a ROW_NUMBER() wrapper instead.
+    @cached_property
+    def supports_offset_fetch(self):
+        return self.connection.get_server_version() >= (7, 2)
+
+    # ALTER TABLE can leave a Db2 for LUW table reorg pending until it is
+    # reorganised with ADMIN_CMD; Db2 for i has no such state.
+    @cached_property
+    def requires_table_reorg(self):
+        return not self.connection.get_dbms_name().startswith('DB2/400')
+
+    # Db2 for i takes several alterations of one column in a single ALTER
+    # COLUMN clause; Db2 for LUW references each column once per statement.
+    @cached_property
+    def can_combine_column_alterations(self):
+        return self.connection.get_dbms_name().startswith('DB2/400')
@@ -0,0 +1,248 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Model fields for BLOB and CLOB columns whose values are read and written in
+chunks instead of as a whole.
+
+    class Document(models.Model):
+        content = LazyBinaryField(chunk_size=256 * 1024)
+
+Loading a Document selects only the length of content. Accessing it returns
+a LobFile, which reads the value from the database as it is consumed:
+
+    for chunk in document.content.chunks():
+        response.write(chunk)
+
+A file-like object can be assigned, or passed to create(), bulk_create()
+and update(). It is read when the statement is sent and bound as a single
+parameter, which the driver sends to the server in pieces. values() and
+values_list() return the length of the value.
+"""
+from django.db import connections, router
+from django.db.models import BinaryField, F, TextField
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.signals import post_init
+
+# Default number of bytes (or characters) read or written per round trip.
+LOB_CHUNK_SIZE = 1024 * 1024
+
+
+class LobLength(int):
+
+    """
+    Length of a LOB value which has not been read, and the primary key of the
+    row it was loaded from.
+    """
+    pk = None
+
+
+class LobFile:
+
+    """
+    Read-only file-like view of the LOB value of one row, fetching it with
+    SUBSTR() a chunk at a time.
+    """
+
+    def __init__(self, instance, field, size=None):
+        self.instance = instance
+        self.field = field
+        self.pk = getattr(size, 'pk', None)
+        if self.pk is None:
+            self.pk = instance.pk
+        self.using = instance._state.db or router.db_for_read(instance.__class__, instance=instance)
+        self.chunk_size = field.chunk_size
+        self._size = size
+        self._position = 0
+        self._empty = field.empty_value
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return self.chunks()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self._query("SELECT LENGTH(%s)" % self._column(), [])
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size=-1):
+        remaining = self.size - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return self._empty
+        pieces = []
+        while size > 0:
+            length = min(size, self.chunk_size)
+            piece = self._read_range(self._position, length)
+            if not piece:
+                break
+            pieces.append(piece)
+            self._position += len(piece)
+            size -= len(piece)
+        return self._empty.join(pieces)
+
+    # Yields the rest of the value chunk_size at a time.
+    def chunks(self, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+    # Db2 for i pads SUBSTR results which run past the end of the value, so
+    # the requested length never exceeds what is left.
+    def _read_range(self, start, length):
+        length = min(length, self.size - start)
+        if length <= 0:
+            return self._empty
+        value = self._query(
+            "SELECT SUBSTR(%s, CAST(%%s AS INTEGER), CAST(%%s AS INTEGER))" % self._column(),
+            [start + 1, length])
+        if value is None:
+            return self._empty
+        return bytes(value) if isinstance(self._empty, bytes) else value
+
+    def _column(self):
+        return connections[self.using].ops.quote_name(self.field.column)
+
+    def _query(self, select, params):
+        connection = connections[self.using]
+        opts = self.instance._meta
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute("%s FROM %s WHERE %s = %%s" % (select, qn(opts.db_table), qn(opts.pk.column)),
+                           params + [self.pk])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class LobDescriptor(DeferredAttribute):
+
+    # Defining __set__ makes this a data descriptor, consulted even when the
+    # value is in the instance __dict__, so unread values can be wrapped.
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, LobLength):
+            value = LobFile(instance, self.field, value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class LazyLobMixin:
+    descriptor_class = LobDescriptor
+
+    def __init__(self, *args, chunk_size=LOB_CHUNK_SIZE, **kwargs):
+        self.chunk_size = chunk_size
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.chunk_size != LOB_CHUNK_SIZE:
+            kwargs['chunk_size'] = self.chunk_size
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        post_init.connect(_remember_lob_rows, sender=cls, weak=False,
+                          dispatch_uid='django_ibmi.fields.remember_lob_rows')
+
+    # Only the length is selected; the value is read when it is used.
+    def select_format(self, compiler, sql, params):
+        return 'LENGTH(%s)' % sql, params
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, int):
+            return LobLength(value)
+        return value
+
+    # An unread value is left as it is in the database. A file-like value is
+    # read here and replaced by its length, so that saving the instance
+    # again does not find the file exhausted.
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if isinstance(value, LobFile) and value.instance is model_instance and value.field is self \
+                and not add:
+            return F(self.attname)
+        if hasattr(value, 'read'):
+            value = self._read_file(value)
+            model_instance.__dict__[self.attname] = LobLength(len(value))
+        return value
+
+    # File-like values which do not go through pre_save(), as with update().
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if hasattr(value, 'read'):
+            value = self._read_file(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    # A LobFile is read from its start, for copying it into another row.
+    def _read_file(self, fileobj):
+        if isinstance(fileobj, LobFile):
+            fileobj.seek(0)
+        return fileobj.read()
+
+
+class LazyBinaryField(LazyLobMixin, BinaryField):
+    empty_value = b''
+
+
+class LazyTextField(LazyLobMixin, TextField):
+    empty_value = ''
+
+
+# Records which row the unread LOB values of a loaded instance belong to, so
+# they can still be copied after its primary key is cleared.
+def _remember_lob_rows(sender, instance, **kwargs):
+    for field in sender._meta.concrete_fields:
+        value = instance.__dict__.get(field.attname)
+        if isinstance(value, LobLength):
+            value.pk = instance.pk
@@ -16,10 +16,73 @@
 # | Authors: Ambrish Bhargava, Tarun Pasrija, Rahul Priyadarshi              |
 # +--------------------------------------------------------------------------+
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import copy
+import mmap
+import os
+import pickle
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 try:
     from django.db.backends import BaseDatabaseIntrospection
 except ImportError:
     from django.db.backends.base.introspection import BaseDatabaseIntrospection
+from django.db import connections
+from django.db.backends.base.introspection import FieldInfo as BaseFieldInfo, TableInfo
+
+FieldInfo = namedtuple('FieldInfo', BaseFieldInfo._fields + ('is_autofield', ))
+
+# Format version of catalog snapshot files, bumped whenever the layout of the
+# cached metadata changes so files written by older releases are ignored.
+SNAPSHOT_VERSION = 4
+
+
+# A snapshot file holds two pickles: a header naming the catalog it was taken
+# from, then the metadata itself. The file is memory mapped so a mismatching
+# header is rejected without reading the rest. Snapshot files are trusted
+# input, like any other file the application loads code or data from.
+def read_snapshot(path, catalog_key):
+    try:
+        with open(path, 'rb') as snapshot_file:
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header = pickle.load(data)
+                if header != (SNAPSHOT_VERSION, catalog_key):
+                    return None
+                return pickle.load(data)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+# Writes the snapshot next to its final location and renames it into place,
+# so readers never see a partially written file.
+def write_snapshot(path, catalog_key, metadata):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+    try:
+        with os.fdopen(fd, 'wb') as snapshot_file:
+            pickle.dump((SNAPSHOT_VERSION, catalog_key), snapshot_file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(metadata, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+# Serialises rebuilding the snapshot at path between processes, so of many
+# workers finding it out of date one reads the catalog and the others wait
+# and load its result. Without fcntl (on Windows) there is no lock.
+@contextmanager
+def snapshot_lock(path):
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
 
 
 # TODO fix pyodbc access in Introspection when doing rest of module
@@ -31,11 +94,50 @@ class DatabaseIntrospection(BaseDatabaseIntrospection):
     This is the class where database metadata information can be generated.
     """
 
+    # Keyed by the DATA_TYPE reported in QSYS2.SYSCOLUMNS
     data_types_reverse = {
-        # TODO define reverse data types
+        'SMALLINT': 'SmallIntegerField',
+        'INTEGER': 'IntegerField',
+        'BIGINT': 'BigIntegerField',
+        'DECIMAL': 'DecimalField',
+        'NUMERIC': 'DecimalField',
+        'DECFLOAT': 'DecimalField',
+        'REAL': 'FloatField',
+        'FLOAT': 'FloatField',
+        'DOUBLE': 'FloatField',
+        'CHAR': 'CharField',
+        'VARCHAR': 'CharField',
+        'GRAPHIC': 'CharField',
+        'VARG': 'CharField',
+        'VARGRAPHIC': 'CharField',
+        'CLOB': 'TextField',
+        'DBCLOB': 'TextField',
+        'XML': 'TextField',
+        'BINARY': 'BinaryField',
+        'VARBIN': 'BinaryField',
+        'VARBINARY': 'BinaryField',
+        'BLOB': 'BinaryField',
+        'DATE': 'DateField',
+        'TIME': 'TimeField',
+        'TIMESTMP': 'DateTimeField',
+        'TIMESTAMP': 'DateTimeField',
     }
 
+    # What each kind of metadata is for a table without any, such as a
+    # table without foreign keys.
+    empty_metadata = {'description': [], 'relations': {}, 'constraints': {}}
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._schema_snapshot = 0
+        self._prefetched = {}
+        self._current_schema = None
+
     def get_field_type(self, data_type, description):
+        if description.is_autofield:
+            if data_type == 'BIGINT':
+                return 'BigAutoField'
+            return 'AutoField'
         return super().get_field_type(data_type, description)
 
     # Converting table name to lower case.
@@ -44,190 +146,377 @@ class DatabaseIntrospection(BaseDatabaseIntrospection):
 
     # Getting the list of all tables, which are present under current schema.
     def get_table_list(self, cursor):
-        TableInfo = namedtuple('TableInfo', ['name', 'type'])
-        table_list = []
-        for table in cursor.connection.tables(cursor.connection.get_current_schema()):
-            table_list.append(TableInfo(table['TABLE_NAME'].lower(), 't'))
-        return table_list
+        cache = self.connection.introspection_cache
+        schema = self.get_current_schema(cursor)
+        self._load_snapshot_file(cursor, schema)
+        table_list = cache.get((schema, None, 'tables'))
+        if table_list is None:
+            table_list = self._read_table_list(cursor, schema)
+            cache.set((schema, None, 'tables'), table_list)
+        return list(table_list)
+
+    def _read_table_list(self, cursor, schema):
+        cursor.execute("SELECT TABLE_NAME, TABLE_TYPE FROM QSYS2.SYSTABLES WHERE TABLE_SCHEMA = %s",
+                       [schema])
+        return [TableInfo(table.lower(), 'v' if table_type == 'V' else 't')
+                for table, table_type in cursor.fetchall()]
+
+    # Returns the schema unqualified names resolve to on this connection.
+    # It is remembered until the connection is replaced or runs SET SCHEMA.
+    def get_current_schema(self, cursor):
+        schema = self._current_schema
+        if schema is None:
+            cursor.execute("VALUES CURRENT SCHEMA")
+            schema = cursor.fetchone()[0]
+            if self.connection.introspection_cache.enabled:
+                self._current_schema = schema
+        return schema
+
+    def forget_current_schema(self):
+        self._current_schema = None
+
+    # While a schema snapshot is active (for the lifetime of a schema editor)
+    # the first lookup of a kind of metadata loads it for every table of the
+    # current schema at once. Outside of it tables are read one at a time.
+    # Either way results are kept in connection.introspection_cache until
+    # invalidate_cache() is called for the table or they expire; with the
+    # default introspection_cache_ttl of 0, only while the snapshot is active.
+    def start_schema_snapshot(self):
+        self._schema_snapshot += 1
+        self.connection.introspection_cache.hold()
+
+    def stop_schema_snapshot(self):
+        self._schema_snapshot -= 1
+        self.connection.introspection_cache.release()
+        if not self.connection.introspection_cache.enabled:
+            self.forget_current_schema()
+
+    def invalidate_cache(self, table_name=None):
+        self.connection.introspection_cache.invalidate(table_name)
+
+    def _cached(self, cursor, kind, table_name, read_table, read_schema):
+        cache = self.connection.introspection_cache
+        schema = self.get_current_schema(cursor)
+        self._load_snapshot_file(cursor, schema)
+        table_name = table_name.lower()
+        value = cache.get((schema, table_name, kind))
+        if value is None and table_name in self._prefetched:
+            value = self._prefetched[table_name].result()[kind]
+            cache.set((schema, table_name, kind), value)
+        if value is None and self._schema_snapshot and cache.get((schema, None, kind)) is None:
+            values = read_schema(cursor)
+            for table in self.get_table_list(cursor):
+                cache.set((schema, table.name, kind), values.get(table.name, self.empty_metadata[kind]))
+            cache.set((schema, None, kind), True)
+            value = cache.get((schema, table_name, kind))
+        if value is None:
+            value = read_table(cursor, table_name)
+            cache.set((schema, table_name, kind), value)
+        return copy.deepcopy(value)
+
+    # Reads the description, relations and constraints of table_names on a
+    # pool of jobs threads, each with a connection of its own. Inside the
+    # block, lookups of a table wait for its result instead of querying, so
+    # tables can be walked in order while later ones are still being read.
+    # progress, when given, is called with (done, total, table_name) from
+    # the worker threads as tables complete.
+    @contextmanager
+    def prefetch(self, table_names, jobs, progress=None):
+        alias = self.connection.alias
+        worker_connections = []
+        done = []
+
+        def read(table_name):
+            connection = connections[alias]
+            if connection not in worker_connections:
+                connection.inc_thread_sharing()
+                worker_connections.append(connection)
+            introspection = connection.introspection
+            with connection.cursor() as cursor:
+                return {
+                    'description': introspection.get_table_descriptions(cursor, [table_name]).get(table_name, []),
+                    'relations': introspection.get_schema_relations(cursor, table_name).get(table_name, {}),
+                    'constraints': introspection._read_constraints(cursor, table_name).get(table_name, {}),
+                }
+
+        def report(future, table_name):
+            done.append(table_name)
+            progress(len(done), len(table_names), table_name)
+
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        try:
+            for table_name in table_names:
+                table_name = table_name.lower()
+                future = executor.submit(read, table_name)
+                if progress is not None:
+                    future.add_done_callback(lambda future, table_name=table_name: report(future, table_name))
+                self._prefetched[table_name] = future
+            yield
+        finally:
+            for future in self._prefetched.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+            self._prefetched = {}
+            for connection in worker_connections:
+                connection.close()
+                connection.dec_thread_sharing()
+
+    # Identifies the state of the catalog of schema: the system it lives on,
+    # the number of tables, the last time any of them was altered, and counts
+    # and sums over its indexes and constraints, which are created and
+    # dropped without altering their table. The key is computed on the
+    # server and read as a single row.
+    def get_catalog_key(self, cursor, schema=None):
+        schema = schema or self.get_current_schema(cursor)
+        cursor.execute(
+            """SELECT CURRENT SERVER, TBL.*, IDX.*, CST.* FROM
+            (SELECT COUNT(*), MAX(LAST_ALTERED_TIMESTAMP) FROM QSYS2.SYSTABLES
+                WHERE TABLE_SCHEMA = %s) TBL (TABLE_COUNT, LAST_ALTERED),
+            (SELECT COUNT(*), SUM(COLUMN_COUNT), SUM(CASE WHEN IS_UNIQUE IN ('U', 'V') THEN 1 ELSE 0 END),
+                SUM(LENGTH(TABLE_NAME) + LENGTH(INDEX_NAME)) FROM QSYS2.SYSINDEXES
+                WHERE TABLE_SCHEMA = %s) IDX (INDEX_COUNT, INDEX_COLUMNS, UNIQUE_COUNT, INDEX_NAMES),
+            (SELECT COUNT(*), SUM(CONSTRAINT_KEYS), SUM(LENGTH(TABLE_NAME) + LENGTH(CONSTRAINT_NAME)),
+                SUM(CASE CONSTRAINT_TYPE WHEN 'PRIMARY KEY' THEN 1 WHEN 'UNIQUE' THEN 2
+                    WHEN 'FOREIGN KEY' THEN 4 ELSE 8 END) FROM QSYS2.SYSCST
+                WHERE TABLE_SCHEMA = %s) CST (CONSTRAINT_COUNT, CONSTRAINT_KEYS, CONSTRAINT_NAMES,
+                    CONSTRAINT_TYPES)""",
+            [schema, schema, schema])
+        row = cursor.fetchone()
+        return (row[0].strip(), schema.strip()) + tuple(row[1:])
+
+    # Reads the metadata of every table of the current schema and writes it to
+    # path, from where load_snapshot() on other processes can pick it up.
+    def save_snapshot(self, cursor, path):
+        schema = self.get_current_schema(cursor)
+        catalog_key = self.get_catalog_key(cursor, schema)
+        metadata = {
+            'tables': self._read_table_list(cursor, schema),
+            'description': self.get_table_descriptions(cursor),
+            'relations': self.get_schema_relations(cursor),
+            'constraints': self._read_constraints(cursor),
+        }
+        self._fill_cache(schema, metadata)
+        write_snapshot(path, catalog_key, metadata)
+        return catalog_key
+
+    # Fills the introspection cache from the snapshot at path. Returns False,
+    # leaving the cache alone, when the file is missing or was taken from a
+    # different system, schema or state of the catalog.
+    def load_snapshot(self, cursor, path):
+        schema = self.get_current_schema(cursor)
+        metadata = read_snapshot(path, self.get_catalog_key(cursor, schema))
+        if metadata is None:
+            return False
+        self._fill_cache(schema, metadata)
+        return True
+
+    def _fill_cache(self, schema, metadata):
+        cache = self.connection.introspection_cache
+        cache.set((schema, None, 'tables'), metadata['tables'])
+        for kind, empty in self.empty_metadata.items():
+            for table in metadata['tables']:
+                cache.set((schema, table.name, kind), metadata[kind].get(table.name, empty))
+            cache.set((schema, None, kind), True)
+
+    # With the introspection_snapshot OPTION set, the first lookup of each
+    # cache lifetime validates the shared snapshot file against the catalog
+    # and loads it, rebuilding the file when it is missing or out of date.
+    # A snapshot that cannot be written (read-only or full file system) only
+    # means metadata is read from the catalog as without the OPTION.
+    def _load_snapshot_file(self, cursor, schema):
+        path = self.connection.settings_dict.get('OPTIONS', {}).get('introspection_snapshot')
+        cache = self.connection.introspection_cache
+        if not path or not cache.enabled or cache.get((schema, None, 'snapshot')) is not None:
+            return
+        cache.set((schema, None, 'snapshot'), True)
+        if self.load_snapshot(cursor, path):
+            return
+        try:
+            with snapshot_lock(path):
+                if not self.load_snapshot(cursor, path):
+                    self.save_snapshot(cursor, path)
+        except OSError:
+            pass
 
     # Generating a dictionary for foreign key details, which are present under current schema.
     def get_relations(self, cursor, table_name):
-        relations = {}
-        schema = cursor.connection.get_current_schema()
-        for fk in cursor.connection.foreign_keys(True, schema, table_name):
-            relations[self.__get_col_index(cursor, schema, table_name, fk['FKCOLUMN_NAME'])] = (
-                self.__get_col_index(cursor, schema, fk['PKTABLE_NAME'], fk['PKCOLUMN_NAME']), fk['PKTABLE_NAME'].lower())
+        return self._cached(
+            cursor, 'relations', table_name,
+            lambda cursor, table_name: self.get_schema_relations(cursor, table_name).get(table_name, {}),
+            self.get_schema_relations)
 
+    # Foreign key details of every table in the current schema (or only of
+    # table_name), read in one catalog query instead of a catalog call per
+    # key column. Returns {table: {column: (referenced column, referenced
+    # table)}}.
+    def get_schema_relations(self, cursor, table_name=None):
+        sql = """SELECT FK.TABLE_NAME, FK.COLUMN_NAME, PK.TABLE_NAME, PK.COLUMN_NAME
+            FROM QSYS2.SYSREFCST REF
+            INNER JOIN QSYS2.SYSKEYCST FK ON FK.CONSTRAINT_SCHEMA = REF.CONSTRAINT_SCHEMA
+                AND FK.CONSTRAINT_NAME = REF.CONSTRAINT_NAME
+            INNER JOIN QSYS2.SYSKEYCST PK ON PK.CONSTRAINT_SCHEMA = REF.UNIQUE_CONSTRAINT_SCHEMA
+                AND PK.CONSTRAINT_NAME = REF.UNIQUE_CONSTRAINT_NAME AND PK.ORDINAL_POSITION = FK.ORDINAL_POSITION
+            WHERE FK.TABLE_SCHEMA = %s"""
+        params = [self.get_current_schema(cursor)]
+        if table_name is not None:
+            sql += " AND FK.TABLE_NAME = %s"
+            params.append(table_name.upper())
+        cursor.execute(sql, params)
+        relations = {}
+        for fk_table, fk_column, pk_table, pk_column in cursor.fetchall():
+            relations.setdefault(fk_table.lower(), {})[fk_column.lower()] = (pk_column.lower(), pk_table.lower())
         return relations
 
-    # Private method. Getting Index position of column by its name
-    def __get_col_index(self, cursor, schema, table_name, col_name):
-        for col in cursor.connection.columns(schema, table_name, [col_name]):
-            return col['ORDINAL_POSITION'] - 1
-
     def get_key_columns(self, cursor, table_name):
         relations = []
-        schema = cursor.connection.get_current_schema()
-        for fk in cursor.connection.foreign_keys(True, schema, table_name):
-            relations.append((fk['FKCOLUMN_NAME'].lower(
-            ), fk['PKTABLE_NAME'].lower(), fk['PKCOLUMN_NAME'].lower()))
-
+        for constraint in self.get_constraints(cursor, table_name).values():
+            if constraint['foreign_key'] is None:
+                continue
+            pk_table = constraint['foreign_key'][0]
+            for fk_column, pk_column in zip(constraint['columns'], constraint['foreign_key'][1:]):
+                relations.append((fk_column, pk_table, pk_column))
         return relations
 
     # Getting list of indexes associated with the table provided.
     def get_indexes(self, cursor, table_name):
         indexes = {}
-        # To skip indexes across multiple fields
-        multifield_indexSet = set()
-        schema = cursor.connection.get_current_schema()
-        all_indexes = cursor.connection.indexes(True, schema, table_name)
-        for index in all_indexes:
-            if (index['ORDINAL_POSITION'] is not None) and (index['ORDINAL_POSITION'] == 2):
-                multifield_indexSet.add(index['INDEX_NAME'])
-
-        for index in all_indexes:
-            temp = {}
-            if index['INDEX_NAME'] in multifield_indexSet:
+        for constraint in self.get_constraints(cursor, table_name).values():
+            # To skip indexes across multiple fields
+            if not constraint['index'] or len(constraint['columns']) != 1:
                 continue
-
-            if index['NON_UNIQUE']:
-                temp['unique'] = False
-            else:
-                temp['unique'] = True
-            temp['primary_key'] = False
-            indexes[index['COLUMN_NAME'].lower()] = temp
-
-        for index in cursor.connection.primary_keys(True, schema, table_name):
-            indexes[index['COLUMN_NAME'].lower()]['primary_key'] = True
-
+            index = indexes.setdefault(constraint['columns'][0], {'primary_key': False, 'unique': False})
+            if constraint['primary_key']:
+                index['primary_key'] = True
+                index['unique'] = True
+            elif constraint['unique']:
+                index['unique'] = True
         return indexes
 
     # Getting the description of the table.
     def get_table_description(self, cursor, table_name):
-        qn = self.connection.ops.quote_name
-        description = []
-        dbms_name = 'dbms_name'
-        schema = cursor.connection.get_current_schema()
-
-        if getattr(cursor.connection, dbms_name) == 'AS':
-            sql = "SELECT TYPE FROM QSYS2.SYSTABLES WHERE TABLE_SCHEMA='%(schema)s' AND TABLE_NAME='%(table)s'" % {
-                'schema': schema.upper(), 'table': table_name.upper()}
-        elif getattr(cursor.connection, dbms_name) != 'DB2':
-            sql = "SELECT TYPE FROM SYSCAT.TABLES WHERE TABSCHEMA='%(schema)s' AND TABNAME='%(table)s'" % {
-                'schema': schema.upper(), 'table': table_name.upper()}
-        else:
-            sql = "SELECT TYPE FROM SYSIBM.SYSTABLES WHERE CREATOR='%(schema)s' AND NAME='%(table)s'" % {
-                'schema': schema.upper(), 'table': table_name.upper()}
-        cursor.execute(sql)
-        table_type = cursor.fetchone()[0]
-
-        if table_type != 'X':
-            cursor.execute(
-                "SELECT * FROM %s FETCH FIRST 1 ROWS ONLY" % qn(table_name))
-            for desc in cursor.description:
-                description.append([desc[0].lower(), ] + desc[1:])
-        return description
+        return self._cached(
+            cursor, 'description', table_name,
+            lambda cursor, table_name: self.get_table_descriptions(cursor, [table_name]).get(table_name, []),
+            self.get_table_descriptions)
+
+    # Describes the columns of the given tables (every table in the current
+    # schema when table_names is None) from QSYS2.SYSCOLUMNS in one query,
+    # without opening a query over the table data itself.
+    # Returns {table: [FieldInfo, ...]}.
+    def get_table_descriptions(self, cursor, table_names=None):
+        sql = "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE, " \
+              "IS_NULLABLE, COLUMN_DEFAULT, IS_IDENTITY FROM QSYS2.SYSCOLUMNS WHERE TABLE_SCHEMA = %s"
+        params = [self.get_current_schema(cursor)]
+        if table_names is not None:
+            table_names = list(table_names)
+            if not table_names:
+                return {}
+            sql += " AND TABLE_NAME IN (%s)" % ", ".join(["%s"] * len(table_names))
+            params.extend(table_name.upper() for table_name in table_names)
+        cursor.execute(sql + " ORDER BY TABLE_NAME, ORDINAL_POSITION", params)
+        descriptions = {}
+        for (table, column, data_type, length, precision, scale,
+             nullable, default, identity) in cursor.fetchall():
+            values = {
+                'name': column.lower(),
+                'type_code': data_type.strip(),
+                'display_size': length,
+                'internal_size': length,
+                'precision': precision,
+                'scale': scale,
+                'null_ok': nullable == 'Y',
+                'default': default,
+                'is_autofield': identity == 'YES',
+            }
+            descriptions.setdefault(table.lower(), []).append(
+                FieldInfo(*(values.get(name) for name in FieldInfo._fields)))
+        return descriptions
 
     def get_constraints(self, cursor, table_name):
-        constraints = {}
-        schema = cursor.connection.get_current_schema()
-        dbms_name = 'dbms_name'
-
-        if getattr(cursor.connection, dbms_name) == 'AS':
-            sql = "SELECT CONSTRAINT_NAME, COLUMN_NAME FROM QSYS2.SYSCSTCOL WHERE TABLE_SCHEMA='%(schema)s' AND " \
-                  "TABLE_NAME='%(table)s'" % {'schema': schema.upper(), 'table': table_name.upper()}
-        elif getattr(cursor.connection, dbms_name) != 'DB2':
-            sql = "SELECT CONSTNAME, COLNAME FROM SYSCAT.COLCHECKS WHERE TABSCHEMA='%(schema)s' AND TABNAME='%(table)s'" % {
-                'schema': schema.upper(), 'table': table_name.upper()}
-        else:
-            sql = "SELECT CHECKNAME, COLNAME FROM SYSIBM.SYSCHECKDEP WHERE TBOWNER='%(schema)s' AND TBNAME='%(table)s'" % {
-                'schema': schema.upper(), 'table': table_name.upper()}
-        cursor.execute(sql)
-        for constname, colname in cursor.fetchall():
-            if constname not in constraints:
-                constraints[constname] = {
-                    'columns': [],
-                    'primary_key': False,
-                    'unique': False,
-                    'foreign_key': None,
-                    'check': True,
-                    'index': False
-                }
-            constraints[constname]['columns'].append(colname.lower())
-
-        if getattr(cursor.connection, dbms_name) == 'AS':
-            sql = "SELECT KEYCOL.CONSTRAINT_NAME, KEYCOL.COLUMN_NAME FROM QSYS2.SYSKEYCST KEYCOL INNER JOIN " \
-                  "QSYS2.SYSCST TABCONST ON KEYCOL.CONSTRAINT_NAME=TABCONST.CONSTRAINT_NAME WHERE TABCONST.TABLE_SCHEMA=" \
-                  "'%(schema)s' and TABCONST.TABLE_NAME='%(table)s' " \
-                  "and TABCONST.TYPE='U'" % {'schema': schema.upper(), 'table': table_name.upper()}
-        elif getattr(cursor.connection, dbms_name) != 'DB2':
-            sql = "SELECT KEYCOL.CONSTNAME, KEYCOL.COLNAME FROM SYSCAT.KEYCOLUSE KEYCOL INNER JOIN SYSCAT.TABCONST TABCONST " \
-                  "ON KEYCOL.CONSTNAME=TABCONST.CONSTNAME WHERE TABCONST.TABSCHEMA='%(schema)s' and TABCONST.TABNAME=" \
-                  "'%(table)s' and TABCONST.TYPE='U'" % {'schema': schema.upper(), 'table': table_name.upper()}
-        else:
-            sql = "SELECT KEYCOL.CONSTNAME, KEYCOL.COLNAME FROM SYSIBM.SYSKEYCOLUSE KEYCOL INNER JOIN SYSIBM.SYSTABCONST " \
-                  "TABCONST ON KEYCOL.CONSTNAME=TABCONST.CONSTNAME WHERE TABCONST.TBCREATOR='%(schema)s' AND TABCONST.TBNAME" \
-                  "='%(table)s' AND TABCONST.TYPE='U'" % {'schema': schema.upper(), 'table': table_name.upper()}
-        cursor.execute(sql)
-        for constname, colname in cursor.fetchall():
-            if constname not in constraints:
-                constraints[constname] = {
-                    'columns': [],
-                    'primary_key': False,
-                    'unique': True,
-                    'foreign_key': None,
-                    'check': False,
-                    'index': True
-                }
-            constraints[constname]['columns'].append(colname.lower())
+        return self._cached(
+            cursor, 'constraints', table_name,
+            lambda cursor, table_name: self._read_constraints(cursor, table_name).get(table_name, {}),
+            self._read_constraints)
 
-        for pkey in cursor.connection.primary_keys(None, schema, table_name):
-            if pkey['PK_NAME'] not in constraints:
-                constraints[pkey['PK_NAME']] = {
-                    'columns': [],
-                    'primary_key': True,
-                    'unique': False,
-                    'foreign_key': None,
-                    'check': False,
-                    'index': True
-                }
-            constraints[pkey['PK_NAME']]['columns'].append(
-                pkey['COLUMN_NAME'].lower())
+    # Reads the constraints and indexes of table_name, or of every table in
+    # the current schema, with one catalog query per constraint kind.
+    # Returns {table: {constraint name: details}}.
+    def _read_constraints(self, cursor, table_name=None):
+        tables = {}
+        params = [self.get_current_schema(cursor)]
+        if table_name is not None:
+            params.append(table_name.upper())
 
-        for fk in cursor.connection.foreign_keys(True, schema, table_name):
-            if fk['FK_NAME'] not in constraints:
-                constraints[fk['FK_NAME']] = {
-                    'columns': [],
-                    'primary_key': False,
-                    'unique': False,
-                    'foreign_key': (fk['PKTABLE_NAME'].lower(), fk['PKCOLUMN_NAME'].lower()),
-                    'check': False,
-                    'index': False
-                }
-            constraints[fk['FK_NAME']]['columns'].append(
-                fk['FKCOLUMN_NAME'].lower())
-            if fk['PKCOLUMN_NAME'].lower() not in constraints[fk['FK_NAME']]['foreign_key']:
-                fkeylist = list(constraints[fk['FK_NAME']]['foreign_key'])
-                fkeylist.append(fk['PKCOLUMN_NAME'].lower())
-                constraints[fk['FK_NAME']]['foreign_key'] = tuple(fkeylist)
-
-        for index in cursor.connection.indexes(True, schema, table_name):
-            if index['INDEX_NAME'] not in constraints:
-                constraints[index['INDEX_NAME']] = {
+        def table_filter(alias):
+            if table_name is None:
+                return ""
+            return " AND %s.TABLE_NAME = %%s" % alias
+
+        def get_constraint(table, name, **flags):
+            constraints = tables.setdefault(table.lower(), {})
+            if name not in constraints:
+                constraints[name] = {
                     'columns': [],
                     'primary_key': False,
                     'unique': False,
                     'foreign_key': None,
                     'check': False,
-                    'index': True
+                    'index': False
                 }
-            elif constraints[index['INDEX_NAME']]['unique']:
-                continue
-            elif constraints[index['INDEX_NAME']]['primary_key']:
+                constraints[name].update(flags)
+            return constraints[name]
+
+        cursor.execute(
+            "SELECT CST.TABLE_NAME, CST.CONSTRAINT_NAME, COL.COLUMN_NAME FROM QSYS2.SYSCST CST "
+            "INNER JOIN QSYS2.SYSCSTCOL COL ON COL.CONSTRAINT_SCHEMA = CST.CONSTRAINT_SCHEMA "
+            "AND COL.CONSTRAINT_NAME = CST.CONSTRAINT_NAME "
+            "WHERE CST.CONSTRAINT_TYPE = 'CHECK' AND CST.TABLE_SCHEMA = %s" + table_filter('CST'), params)
+        for table, constname, colname in cursor.fetchall():
+            get_constraint(table, constname, check=True)['columns'].append(colname.lower())
+
+        cursor.execute(
+            "SELECT CST.TABLE_NAME, CST.CONSTRAINT_NAME, CST.CONSTRAINT_TYPE, KEYCOL.COLUMN_NAME "
+            "FROM QSYS2.SYSCST CST INNER JOIN QSYS2.SYSKEYCST KEYCOL "
+            "ON KEYCOL.CONSTRAINT_SCHEMA = CST.CONSTRAINT_SCHEMA AND KEYCOL.CONSTRAINT_NAME = CST.CONSTRAINT_NAME "
+            "WHERE CST.CONSTRAINT_TYPE IN ('PRIMARY KEY', 'UNIQUE') AND CST.TABLE_SCHEMA = %s" +
+            table_filter('CST') + " ORDER BY KEYCOL.ORDINAL_POSITION", params)
+        for table, constname, consttype, colname in cursor.fetchall():
+            if consttype == 'PRIMARY KEY':
+                constraint = get_constraint(table, constname, primary_key=True, index=True)
+            else:
+                constraint = get_constraint(table, constname, unique=True, index=True)
+            constraint['columns'].append(colname.lower())
+
+        cursor.execute(
+            "SELECT FK.TABLE_NAME, REF.CONSTRAINT_NAME, FK.COLUMN_NAME, PK.TABLE_NAME, PK.COLUMN_NAME "
+            "FROM QSYS2.SYSREFCST REF "
+            "INNER JOIN QSYS2.SYSKEYCST FK ON FK.CONSTRAINT_SCHEMA = REF.CONSTRAINT_SCHEMA "
+            "AND FK.CONSTRAINT_NAME = REF.CONSTRAINT_NAME "
+            "INNER JOIN QSYS2.SYSKEYCST PK ON PK.CONSTRAINT_SCHEMA = REF.UNIQUE_CONSTRAINT_SCHEMA "
+            "AND PK.CONSTRAINT_NAME = REF.UNIQUE_CONSTRAINT_NAME AND PK.ORDINAL_POSITION = FK.ORDINAL_POSITION "
+            "WHERE FK.TABLE_SCHEMA = %s" + table_filter('FK') + " ORDER BY FK.ORDINAL_POSITION", params)
+        for table, constname, fk_column, pk_table, pk_column in cursor.fetchall():
+            constraint = get_constraint(table, constname, foreign_key=(pk_table.lower(), ))
+            constraint['columns'].append(fk_column.lower())
+            constraint['foreign_key'] += (pk_column.lower(), )
+
+        # Indexes backing a primary key or unique constraint are already
+        # listed under the constraint's name. IS_UNIQUE is U for unique
+        # indexes and V for ones unique where not null.
+        key_constraints = {(table, name) for table, constraints in tables.items()
+                           for name, constraint in constraints.items()
+                           if constraint['unique'] or constraint['primary_key']}
+        cursor.execute(
+            "SELECT IDX.TABLE_NAME, IDX.INDEX_NAME, IDX.IS_UNIQUE, KEYS.COLUMN_NAME FROM QSYS2.SYSINDEXES IDX "
+            "INNER JOIN QSYS2.SYSKEYS KEYS ON KEYS.INDEX_SCHEMA = IDX.INDEX_SCHEMA "
+            "AND KEYS.INDEX_NAME = IDX.INDEX_NAME "
+            "WHERE IDX.TABLE_SCHEMA = %s" + table_filter('IDX') + " ORDER BY KEYS.ORDINAL_POSITION", params)
+        for table, index_name, is_unique, colname in cursor.fetchall():
+            if (table.lower(), index_name) in key_constraints:
                 continue
-            constraints[index['INDEX_NAME']]['columns'].append(
-                index['COLUMN_NAME'].lower())
-        return constraints
+            constraint = get_constraint(table, index_name, index=True, unique=is_unique in ('U', 'V'))
+            constraint['columns'].append(colname.lower())
+        return tables
 
     def get_sequences(self, cursor, table_name, table_fields=()):
         from django.db import models
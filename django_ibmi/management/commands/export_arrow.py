@@ -0,0 +1,64 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from django_ibmi import arrow
+
+
+class Command(BaseCommand):
+    help = "Streams the rows of a model to a Parquet or Arrow IPC file in bounded memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model to export, as app_label.ModelName.')
+        parser.add_argument('output', help='File to write.')
+        parser.add_argument(
+            '--fields', default='',
+            help='Comma separated fields to export (default: all concrete fields).',
+        )
+        parser.add_argument(
+            '--format', choices=('parquet', 'arrow'),
+            help='Output format (default: from the output file extension, else parquet).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=arrow.BATCH_SIZE,
+            help='Rows per record batch (default %d).' % arrow.BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database to export from. Defaults to the "default" database.',
+        )
+
+    def handle(self, **options):
+        if arrow.pyarrow is None:
+            raise CommandError("pyarrow is required to export Arrow or Parquet files.")
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        fields = [name.strip() for name in options['fields'].split(',') if name.strip()]
+        if not fields:
+            fields = [field.attname for field in model._meta.concrete_fields]
+        output_format = options['format']
+        if output_format is None:
+            output_format = 'arrow' if options['output'].endswith(('.arrow', '.feather', '.ipc')) else 'parquet'
+        queryset = model._default_manager.using(options['database']).order_by()
+        rows = arrow.export_queryset(queryset, options['output'], *fields,
+                                     format=output_format, batch_size=options['batch_size'])
+        if options['verbosity'] >= 1:
+            self.stdout.write("Exported %d rows to %s" % (rows, options['output']))
@@ -0,0 +1,53 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+from django.core.management.commands import inspectdb
+from django.db import connections
+
+
+class Command(inspectdb.Command):
+    help = inspectdb.Command.help + (
+        " With --jobs, tables are introspected in parallel, one connection per job.")
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of tables to introspect at the same time (default 1).',
+        )
+
+    def handle_inspection(self, options):
+        connection = connections[options['database']]
+        jobs = options.get('jobs', 1)
+        if jobs <= 1 or not hasattr(connection.introspection, 'prefetch'):
+            yield from super().handle_inspection(options)
+            return
+        with connection.cursor() as cursor:
+            table_names = options['table'] or sorted(
+                info.name for info in connection.introspection.get_table_list(cursor)
+                if info.type == 't' or (info.type == 'v' and options['include_views'])
+            )
+        with connection.introspection.prefetch(table_names, jobs, self.report_progress):
+            yield from super().handle_inspection(options)
+
+    # Progress goes to stderr so the generated models can be redirected.
+    def report_progress(self, done, total, table_name):
+        if self.verbosity >= 1:
+            self.stderr.write("Introspected %s (%d/%d)" % (table_name, done, total))
+
+    def execute(self, *args, **options):
+        self.verbosity = options.get('verbosity', 1)
+        return super().execute(*args, **options)
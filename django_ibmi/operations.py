@@ -33,6 +33,16 @@ from django.conf import settings
 
 dbms_name = 'dbms_name'
 
+# Model fields stored in LOB columns (CLOB, BLOB).
+lob_field_types = ('TextField', 'BinaryField')
+
+# Longest SQL statement Db2 for i accepts, in bytes.
+MAX_STATEMENT_LENGTH = 2097152
+
+# Below this many rows bulk_create uses a multi-row VALUES statement, above
+# it the rows are sent with one array-bound executemany.
+BULK_EXECUTEMANY_THRESHOLD = 500
+
 
 class DatabaseOperations (BaseDatabaseOperations):
     def __init__(self, connection):
@@ -114,7 +124,9 @@ class DatabaseOperations (BaseDatabaseOperations):
             sub_expressions[1] = strr.replace('+', '-')
             return super().combine_expression(operator, sub_expressions)
 
-    def convert_binaryfield_value(self, value, expression, connections, context):
+    def convert_binaryfield_value(self, value, expression, connection):
+        if isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
         return value
 
     def format_for_duration_arithmetic(self, sql):
@@ -238,6 +250,21 @@ class DatabaseOperations (BaseDatabaseOperations):
     def last_insert_id(self, cursor, table_name, pk_name):
         return cursor.last_identity_val
 
+    # Generated values are read by selecting from the FINAL TABLE of the
+    # insert (see compiler.SQLInsertCompiler), so nothing is appended here.
+    def return_insert_columns(self, fields):
+        return '', ()
+
+    def fetch_returned_insert_rows(self, cursor):
+        return cursor.fetchall()
+
+    # The same for Django 2.2
+    def return_insert_id(self):
+        return '', ()
+
+    def fetch_returned_insert_ids(self, cursor):
+        return [row[0] for row in cursor.fetchall()]
+
     # In case of WHERE clause, if the search is required to be case
     # insensitive then converting left hand side field to upper.
     def lookup_cast(self, lookup_type, internal_type=None):
@@ -262,6 +289,16 @@ class DatabaseOperations (BaseDatabaseOperations):
     def no_limit_value(self):
         return None
 
+    # Native paging clause, used when features.supports_offset_fetch is set.
+    def limit_offset_sql(self, low_mark, high_mark):
+        limit, offset = self._get_limit_offset_params(low_mark, high_mark)
+        sql = []
+        if offset:
+            sql.append('OFFSET %d ROWS' % offset)
+        if limit is not None:
+            sql.append('FETCH NEXT %d ROWS ONLY' % limit)
+        return ' '.join(sql)
+
     # Method to point custom query class implementation.
     def query_class(self, DefaultQueryClass):
         return query.query_class(DefaultQueryClass)
@@ -507,17 +544,36 @@ class DatabaseOperations (BaseDatabaseOperations):
         upper_bound = datetime.date(int(value), 12, 31)
         return [lower_bound, upper_bound]
 
-    def bulk_insert_sql(self, fields, num_values):
-        values_sql = "( %s )" % (", ".join(["%s"] * len(fields)))
-        if isinstance(num_values, int):
-            bulk_values_sql = "VALUES " + \
-                ", ".join([values_sql] * (num_values))
-        else:
-            bulk_values_sql = "VALUES " + \
-                ", ".join([values_sql] * len(num_values))
-        return bulk_values_sql
-
-    def for_update_sql(self, nowait=False):
+    def bulk_insert_sql(self, fields, placeholder_rows):
+        if isinstance(placeholder_rows, int):
+            values_sql = "( %s )" % (", ".join(["%s"] * len(fields)))
+            return "VALUES " + ", ".join([values_sql] * placeholder_rows)
+        return "VALUES " + ", ".join(
+            "( %s )" % ", ".join(row) for row in placeholder_rows)
+
+    # Size bulk_create batches so a multi-row VALUES statement stays within
+    # the Db2 for i limits on parameter markers and statement length.
+    def bulk_batch_size(self, fields, objs):
+        if not fields:
+            return len(objs)
+        max_params = self.connection.features.max_query_params // len(fields)
+        # Column list of up to 128 character quoted names, then "?, " per
+        # marker and "( ), " per row.
+        header_length = len(fields) * 131 + 256
+        max_length = (MAX_STATEMENT_LENGTH - header_length) // (len(fields) * 3 + 5)
+        return max(1, min(max_params, max_length))
+
+    # Large batches of plain values go through pyodbc fast_executemany, which
+    # binds every row of a single-row INSERT at once. Small batches, and
+    # batches with LOB columns the driver cannot array-bind, use a multi-row
+    # VALUES statement instead.
+    def bulk_insert_use_executemany(self, fields, objs):
+        if len(objs) < BULK_EXECUTEMANY_THRESHOLD or not fields:
+            return False
+        return not any(field.get_internal_type() in lob_field_types
+                       for field in fields)
+
+    def for_update_sql(self, nowait=False, skip_locked=False, of=()):
         # DB2 doesn't support nowait select for update
         if nowait:
             raise utils.DatabaseError(
@@ -0,0 +1,203 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Translation of the DATABASES settings into IBM i Access ODBC Driver
+connection parameters, shared by the connection wrapper and dbshell.
+"""
+from distutils import util
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Connection string prefix of every connection the backend opens.
+DRIVER = "Driver=IBM i Access ODBC Driver; UNICODESQL=1; TRUEAUTOCOMMIT=1;"
+
+# OPTIONS passed on to the driver.
+allowed_opts = {'system', 'user', 'password', 'autocommit', 'readonly',
+                'timeout', 'database', 'use_system_naming',
+                'library_list', 'current_schema', 'performance'
+                }
+
+# OPTIONS understood by the backend itself. They are validated together with
+# the driver options but never passed on to pyodbc.connect.
+backend_opts = {'chunked_fetch_memory', 'introspection_cache_ttl', 'introspection_snapshot', 'pool',
+                'usable_check_interval', 'statement_cache_size'}
+
+# pyodbc.connect arguments which are connection attributes rather than
+# connection string keywords.
+connect_attributes = {'autocommit', 'readonly', 'timeout'}
+
+
+def _flag(value):
+    return '1' if util.strtobool(str(value)) else '0'
+
+
+def _kilobytes(maximum):
+    def convert(value):
+        value = int(value)
+        if not 0 <= value <= maximum:
+            raise ValueError("must be between 0 and %d" % maximum)
+        return str(value)
+    return convert
+
+
+_optimize_goals = {'default': '0', 'first_io': '1', 'all_io': '2'}
+
+
+def _optimize_goal(value):
+    try:
+        return _optimize_goals[value]
+    except KeyError:
+        raise ValueError("must be one of %s" % ', '.join(sorted(_optimize_goals)))
+
+
+# Keys of the 'performance' OPTION and the driver keywords they set.
+performance_opts = {
+    'block_fetch': ('BLOCKFETCH', _flag),
+    'block_size': ('BLOCKSIZE', _kilobytes(8192)),
+    'compression': ('COMPRESSION', _flag),
+    'lazy_close': ('LAZYCLOSE', _flag),
+    'max_field_length': ('MAXFIELDLEN', _kilobytes(2097152)),
+    'query_optimize_goal': ('QUERYOPTIMIZEGOAL', _optimize_goal),
+    'extended_dynamic': ('EXTENDEDDYNAMIC', _flag),
+    'package_library': ('DFTPKGLIB', str),
+    'package': ('DEFAULTPKG', str),
+    'prefetch': ('PREFETCH', _flag),
+}
+
+# Named starting points for the 'performance' OPTION. "oltp" favours the
+# first rows of short queries, "bulk_extract" the throughput of large reads.
+performance_presets = {
+    'oltp': {
+        'block_fetch': True,
+        'block_size': 32,
+        'lazy_close': True,
+        'compression': False,
+        'query_optimize_goal': 'first_io',
+        'prefetch': False,
+    },
+    'bulk_extract': {
+        'block_fetch': True,
+        'block_size': 512,
+        'lazy_close': True,
+        'compression': True,
+        'max_field_length': 15360,
+        'query_optimize_goal': 'all_io',
+        'prefetch': True,
+    },
+}
+
+
+# The driver appends three characters describing the statement attributes
+# to the package name, which may therefore be at most seven characters.
+PACKAGE_NAME_LENGTH = 7
+
+
+# Names the SQL package after the Django project, so every process of one
+# application shares the statements prepared by any of them, e.g.
+# "MYSHOP" for the settings module "myshop.settings.production".
+def default_package(library):
+    project = (settings.SETTINGS_MODULE or 'django').split('.')[0]
+    name = re.sub(r'[^A-Z0-9]', '', project.upper())[:PACKAGE_NAME_LENGTH] or 'DJANGO'
+    if not name[0].isalpha():
+        name = ('P' + name)[:PACKAGE_NAME_LENGTH]
+    return '%s/%s(IBM),2,0,1,0,512' % (library, name)
+
+
+# Resolves the 'performance' OPTION, either a preset name or a dict which may
+# name a preset to start from, into driver connection keywords.
+def performance_keywords(performance):
+    if isinstance(performance, str):
+        performance = {'preset': performance}
+    performance = dict(performance)
+    preset = performance.pop('preset', None)
+    if preset is not None:
+        if preset not in performance_presets:
+            raise ImproperlyConfigured(
+                "Unknown performance preset '%s', expected one of: %s" %
+                (preset, ', '.join(sorted(performance_presets))))
+        performance = dict(performance_presets[preset], **performance)
+    keywords = {}
+    for name, value in performance.items():
+        if name not in performance_opts:
+            raise ImproperlyConfigured(
+                "Unknown performance option '%s', expected one of: %s" %
+                (name, ', '.join(sorted(performance_opts))))
+        keyword, convert = performance_opts[name]
+        try:
+            keywords[keyword] = convert(value)
+        except ValueError as e:
+            raise ImproperlyConfigured("Invalid value %r for performance option '%s': %s" % (value, name, e))
+    if keywords.get('EXTENDEDDYNAMIC') == '1' and 'DEFAULTPKG' not in keywords:
+        keywords['DEFAULTPKG'] = default_package(keywords.get('DFTPKGLIB', 'QGPL'))
+    return keywords
+
+
+# To get dict of connection parameters
+def get_connection_params(settings_dict):
+    if 'NAME' not in settings_dict:
+        raise ImproperlyConfigured(
+            "settings.DATABASES is improperly configured. "
+            "Please supply the NAME value.")
+    conn_params = {
+        'system': settings_dict['NAME']
+    }
+    if 'USER' in settings_dict:
+        conn_params['user'] = settings_dict['USER']
+    if 'PASSWORD' in settings_dict:
+        conn_params['password'] = settings_dict['PASSWORD']
+
+    if 'OPTIONS' in settings_dict:
+        conn_params.update(settings_dict['OPTIONS'])
+
+    if not (allowed_opts | backend_opts).issuperset(conn_params.keys()):
+        raise ValueError("Option entered not valid for "
+                         "IBM i Access ODBC Driver")
+
+    for opt in backend_opts:
+        conn_params.pop(opt, None)
+
+    if 'performance' in conn_params:
+        conn_params.update(performance_keywords(conn_params.pop('performance')))
+
+    try:
+        conn_params['Naming'] = \
+            str(util.strtobool(conn_params['use_system_naming']))
+    except (ValueError, KeyError):
+        conn_params['Naming'] = '0'
+
+    if 'current_schema' in conn_params or 'library_list' in conn_params:
+        conn_params['DefaultLibraries'] = \
+            conn_params.pop('current_schema', '') + ','
+        library_list = conn_params.pop('library_list', '')
+        if isinstance(library_list, str):
+            conn_params['DefaultLibraries'] += library_list
+        else:
+            conn_params['DefaultLibraries'] += ','.join(library_list)
+
+    return conn_params
+
+
+# Builds the complete connection string for tools which take one, such as
+# isql. Attributes pyodbc sets on the connection itself are left out.
+def connection_string(conn_params):
+    keywords = {'user': 'UID', 'password': 'PWD'}
+    return DRIVER + ''.join(
+        ' %s=%s;' % (keywords.get(name, name.upper()), value)
+        for name, value in conn_params.items() if name not in connect_attributes)
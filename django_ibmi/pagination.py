@@ -0,0 +1,157 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+"""
+Keyset (seek) pagination for querysets on Db2 for i.
+
+Instead of skipping rows with OFFSET, every page continues from the
+ordering key of the last row of the previous page:
+
+    paginator = KeysetPaginator(Order.objects.all(), 50, ordering=['-created', 'id'])
+    page = paginator.page(request.GET.get('cursor'))
+    ... page.object_list, page.next_token ...
+
+The ordering columns should be indexed and must not be nullable. The
+primary key is appended when the ordering does not already end with it,
+so the key is unique. Only fields of the model itself can be ordered by;
+expressions and lookups through relations are rejected.
+"""
+from collections import namedtuple
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core import signing
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+KeysetPage = namedtuple('KeysetPage', ['object_list', 'next_token', 'has_next'])
+
+TOKEN_SALT = 'django_ibmi.pagination'
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+# Key values JSON has no type for are stored as [tag, text] pairs. The text
+# is lossless (datetimes and times keep their microseconds), so the seek
+# predicate compares against exactly the value of the last row.
+_value_types = (
+    ('datetime', datetime.datetime, parse_datetime),
+    ('date', datetime.date, parse_date),
+    ('time', datetime.time, parse_time),
+    ('decimal', decimal.Decimal, decimal.Decimal),
+    ('uuid', uuid.UUID, uuid.UUID),
+)
+
+
+def _dump_value(value):
+    for tag, value_type, parse in _value_types:
+        if isinstance(value, value_type):
+            return [tag, value.isoformat() if hasattr(value, 'isoformat') else str(value)]
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, list):
+        for tag, value_type, parse in _value_types:
+            if value[:1] == [tag] and len(value) == 2:
+                return parse(value[1])
+        raise InvalidToken("Invalid value in continuation token")
+    return value
+
+
+class _TokenSerializer:
+    def dumps(self, obj):
+        return json.dumps([_dump_value(value) for value in obj], separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        values = json.loads(data.decode('latin-1'))
+        if not isinstance(values, list):
+            raise InvalidToken("Continuation token does not match the ordering")
+        return [_load_value(value) for value in values]
+
+
+class KeysetPaginator:
+
+    """
+    Pages through a queryset with a seek predicate on its ordering key,
+    so fetching page N costs the same as fetching the first page.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        opts = queryset.model._meta
+        ordering = list(ordering or queryset.query.order_by or opts.ordering)
+        for name in ordering:
+            if not isinstance(name, str):
+                raise ValueError(
+                    "KeysetPaginator orders by field names only, not %r" % (name,))
+            if LOOKUP_SEP in name or name == '?':
+                raise ValueError(
+                    "KeysetPaginator cannot order by %r; use a field of %s" % (name, opts.object_name))
+        if not ordering or ordering[-1].lstrip('-') not in ('pk', opts.pk.name):
+            ordering.append('pk')
+        self.ordering = ordering
+        self.keys = []
+        for name in ordering:
+            descending = name.startswith('-')
+            field = opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-'))
+            name = field.name
+            self.keys.append((name, field.attname, descending))
+
+    # Returns the page following the one token was issued for, or the first
+    # page when token is None.
+    def page(self, token=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if token:
+            queryset = queryset.filter(self._seek_filter(self._decode(token)))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_token = self._encode(rows[-1]) if has_next else None
+        return KeysetPage(rows, next_token, has_next)
+
+    # Builds "a > ? OR (a = ? AND b > ?) ..." for the ordering key, with the
+    # comparison flipped for descending columns.
+    def _seek_filter(self, values):
+        seek = Q()
+        for index, (name, attname, descending) in enumerate(self.keys):
+            term = Q(**{'%s__%s' % (name, 'lt' if descending else 'gt'): values[index]})
+            for prev_index, (prev_name, prev_attname, prev_descending) in enumerate(self.keys[:index]):
+                term &= Q(**{prev_name: values[prev_index]})
+            seek |= term
+        return seek
+
+    def _encode(self, row):
+        if isinstance(row, dict):
+            values = [row[name] for name, attname, descending in self.keys]
+        else:
+            values = [getattr(row, attname) for name, attname, descending in self.keys]
+        return signing.dumps(values, salt=TOKEN_SALT, serializer=_TokenSerializer, compress=True)
+
+    def _decode(self, token):
+        try:
+            values = signing.loads(token, salt=TOKEN_SALT, serializer=_TokenSerializer)
+        except signing.BadSignature:
+            raise InvalidToken("Invalid continuation token")
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidToken("Continuation token does not match the ordering")
+        return values
@@ -0,0 +1,329 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+
+"""
+Process-local pool of pyodbc connections, enabled per database with the
+``pool`` OPTION:
+
+    'OPTIONS': {
+        'pool': {'min_size': 2, 'max_size': 20, 'max_lifetime': 3600,
+                 'idle_timeout': 300, 'pre_ping': True},
+    }
+
+``'pool': True`` uses the defaults. A pool belongs to one alias and one set
+of connection parameters; when the parameters of the alias change (as when
+the test database is created) the old pool is closed and a new one started. DatabaseWrapper.get_new_connection()
+takes connections from the pool and DatabaseWrapper.close() gives them back,
+so with CONN_MAX_AGE = 0 each request borrows an open connection instead of
+starting a new host server job.
+"""
+from collections import deque
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+import pyodbc
+
+from . import options as backend_options
+from .utils import StatementCache
+
+# One pool is kept per database alias, together with the connection
+# parameters its connections were opened with.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Values of the isolation_level pool option.
+isolation_levels = {
+    'read_uncommitted': pyodbc.SQL_TXN_READ_UNCOMMITTED,
+    'read_committed': pyodbc.SQL_TXN_READ_COMMITTED,
+    'repeatable_read': pyodbc.SQL_TXN_REPEATABLE_READ,
+    'serializable': pyodbc.SQL_TXN_SERIALIZABLE,
+}
+
+# Connections inherited from the parent process after a fork. They share the
+# parent's sockets, so they are neither used nor closed (which would end the
+# parent's session) but kept referenced until the process exits.
+_inherited = []
+
+
+def _is_inherited(connection):
+    return any(connection is inherited for inherited in _inherited)
+
+
+def connection_pool(connection):
+    pool_options = connection.settings_dict.get('OPTIONS', {}).get('pool')
+    if not pool_options:
+        return None
+    params = repr(sorted(backend_options.get_connection_params(connection.settings_dict).items()))
+    with _pools_lock:
+        current = _pools.get(connection.alias)
+        if current is not None and current[0] == params:
+            return current[1]
+        try:
+            pool = ConnectionPool(**({} if pool_options is True else pool_options))
+        except (TypeError, ValueError) as e:
+            raise ImproperlyConfigured("Invalid pool OPTIONS for database '%s': %s" % (connection.alias, e))
+        _pools[connection.alias] = (params, pool)
+    # Connections still borrowed from the old pool are closed when they are
+    # given back, as the new pool does not know them.
+    if current is not None:
+        current[1].close()
+    return pool
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created', 'last_used', 'schema', 'library_list', 'changed',
+                 'statements')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.last_used = time.monotonic()
+        self.schema = None
+        self.library_list = None
+        # Session settings changed while the connection was borrowed
+        self.changed = set()
+        self.statements = None
+
+
+class ConnectionPool:
+
+    """
+    Thread safe pool of open connections. At most max_size connections exist
+    at a time; callers wait up to timeout seconds for one to be returned.
+    Connections older than max_lifetime or idle for longer than idle_timeout
+    seconds are closed rather than reused, and with pre_ping each connection
+    is probed before it is handed out. Returned connections are rolled back
+    and get back the current schema, user library list and isolation_level
+    they were opened with, where a statement reported through changed() may
+    have altered them.
+    """
+
+    def __init__(self, min_size=0, max_size=10, max_lifetime=None, idle_timeout=None,
+                 pre_ping=False, timeout=30, reset_schema=True, reset_library_list=True,
+                 isolation_level='read_committed'):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        if isolation_level is not None and isolation_level not in isolation_levels:
+            raise ValueError("isolation_level must be one of %s" % ', '.join(sorted(isolation_levels)))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self.reset_schema = reset_schema
+        self.reset_library_list = reset_library_list
+        self.isolation_level = isolation_level
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+
+    # A child process must not touch connections opened by its parent, so
+    # the first use after a fork starts over with an empty pool.
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            _inherited.extend(entry.connection for entry in self._idle)
+            _inherited.extend(entry.connection for entry in self._in_use.values())
+            self._init_state()
+
+    # Returns an open connection, creating it with connect() when no idle one
+    # is available and the pool has room.
+    def acquire(self, connect):
+        self._check_fork()
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        self._fill(connect)
+        while True:
+            with self._lock:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise pyodbc.OperationalError(
+                            "Timed out after %ss waiting for a pooled connection" % self.timeout)
+                    self._lock.wait(remaining)
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._size += 1
+            if entry is None:
+                entry = self._open(connect)
+            elif self._expired(entry) or (self.pre_ping and not self._ping(entry.connection)):
+                self._discard(entry)
+                continue
+            with self._lock:
+                self._in_use[id(entry.connection)] = entry
+            return entry.connection
+
+    # Takes a connection back, resetting it to the state it was opened in.
+    # Connections that fail to reset, or have expired, are closed instead.
+    # A connection inherited from the parent process is dropped untouched.
+    def release(self, connection):
+        self._check_fork()
+        with self._lock:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            if not _is_inherited(connection):
+                self._close(connection)
+            return
+        try:
+            self._reset(entry)
+        except pyodbc.Error:
+            self._discard(entry)
+            return
+        if self._expired(entry):
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(entry)
+            self._prune()
+            self._lock.notify()
+
+    # Closes every idle connection. Connections in use are unaffected.
+    def close(self):
+        self._check_fork()
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close(entry.connection)
+
+    # Records that a statement run on a borrowed connection may have changed
+    # one of its session settings: 'schema', 'library_list' or 'isolation'.
+    def changed(self, connection, setting):
+        with self._lock:
+            entry = self._in_use.get(id(connection))
+            if entry is not None:
+                entry.changed.add(setting)
+
+    # The statement cache of a borrowed connection lives as long as the
+    # physical connection, so prepared statements outlast each checkout.
+    def statement_cache(self, connection, maxsize):
+        with self._lock:
+            entry = self._in_use.get(id(connection))
+        if entry is None:
+            return StatementCache(connection, maxsize)
+        if entry.statements is None:
+            entry.statements = StatementCache(connection, maxsize)
+        return entry.statements
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'idle': len(self._idle),
+            'in_use': len(self._in_use),
+            'max_size': self.max_size,
+        }
+
+    def _fill(self, connect):
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            entry = self._open(connect)
+            with self._lock:
+                self._idle.appendleft(entry)
+                self._lock.notify()
+
+    def _open(self, connect):
+        try:
+            entry = _PooledConnection(connect())
+            if self.isolation_level is not None:
+                entry.connection.set_attr(pyodbc.SQL_ATTR_TXN_ISOLATION, isolation_levels[self.isolation_level])
+            if self.reset_schema:
+                entry.schema = self._query(entry.connection, "VALUES CURRENT SCHEMA")[0][0]
+            if self.reset_library_list:
+                entry.library_list = self._library_list(entry.connection)
+        except BaseException:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        return entry
+
+    # Only the settings changed while the connection was borrowed are reset.
+    # Autocommit is left alone, as Django sets it on every new connection.
+    def _reset(self, entry):
+        connection = entry.connection
+        if not connection.autocommit:
+            connection.rollback()
+        changed = entry.changed
+        if 'isolation' in changed and self.isolation_level is not None:
+            connection.set_attr(pyodbc.SQL_ATTR_TXN_ISOLATION, isolation_levels[self.isolation_level])
+        if 'library_list' in changed and entry.library_list is not None \
+                and self._library_list(connection) != entry.library_list:
+            command = "CHGLIBL LIBL(%s)" % (' '.join(entry.library_list) or '*NONE')
+            self._query(connection, "CALL QSYS2.QCMDEXC('%s')" % command.replace("'", "''"), rows=False)
+        if 'schema' in changed and entry.schema is not None:
+            self._query(connection, "SET SCHEMA '%s'" % entry.schema.replace("'", "''"), rows=False)
+        changed.clear()
+
+    def _library_list(self, connection):
+        return [row[0] for row in self._query(
+            connection, "SELECT SYSTEM_SCHEMA_NAME FROM QSYS2.LIBRARY_LIST_INFO "
+                        "WHERE TYPE = 'USER' ORDER BY ORDINAL_POSITION")]
+
+    def _query(self, connection, sql, rows=True):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.fetchall() if rows else None
+        finally:
+            cursor.close()
+
+    def _ping(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("VALUES 1").fetchone()
+            finally:
+                cursor.close()
+        except pyodbc.Error:
+            return False
+        return True
+
+    def _expired(self, entry):
+        now = time.monotonic()
+        if self.max_lifetime is not None and now - entry.created > self.max_lifetime:
+            return True
+        return self.idle_timeout is not None and now - entry.last_used > self.idle_timeout
+
+    # Closes idle connections past their idle timeout, oldest first, while
+    # keeping min_size connections open. Called with the lock held.
+    def _prune(self):
+        while self._size > self.min_size and self._idle and self._expired(self._idle[0]):
+            entry = self._idle.popleft()
+            self._size -= 1
+            self._close(entry.connection)
+
+    def _discard(self, entry):
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+        self._close(entry.connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except pyodbc.Error:
+            pass
@@ -18,6 +18,7 @@
 
 import datetime
 import copy
+import re
 
 try:
     from django.db.backends.schema import BaseDatabaseSchemaEditor
@@ -26,10 +27,28 @@ except ImportError:
 
 from django.db import models
 from django.db.backends.utils import truncate_name
-from django.db.models.fields.related import ManyToManyField
 import pyodbc
 Error = pyodbc.Error
 
+# Statements that can change constraints or indexes.
+ddl_re = re.compile(r'^\s*(?:ALTER|CREATE|DROP|RENAME)\s', re.I)
+
+# DDL whose effect on constraints is limited to the table it names. Dropping
+# a table also drops foreign keys of other tables, so it is not listed.
+ddl_table_re = re.compile(
+    r'^\s*(?:(?:ALTER|CREATE)\s+TABLE|CREATE\s+(?:UNIQUE\s+)?INDEX\s+\S+\s+ON)\s+([^\s(]+)', re.I)
+
+# ALTER TABLE statements with a single clause, which can share one statement
+# with other clauses for the same table.
+alter_clause_re = re.compile(
+    r'^\s*ALTER\s+TABLE\s+([^\s(]+)\s+((?:ADD|ALTER|DROP)\s+(?:(COLUMN|CONSTRAINT)\s+([^\s(]+)|PRIMARY\s+KEY\b).*)$',
+    re.I | re.S)
+column_alteration_re = re.compile(r'^ALTER\s+COLUMN\s+\S+\s+((?:SET|DROP)\s+(\w+).*)$', re.I | re.S)
+primary_key_re = re.compile(r'\bPRIMARY\s+KEY\b', re.I)
+
+# ALTER TABLE statements that can leave the table reorg pending on Db2 for LUW.
+reorg_re = re.compile(r'^\s*ALTER\s+TABLE\s+([^\s(]+)\s.*\b(?:ALTER|DROP)\s+COLUMN\b', re.I | re.S)
+
 
 class DB2SchemaEditor(BaseDatabaseSchemaEditor):
     psudo_column_prefix = 'psudo_'
@@ -46,10 +65,134 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
     sql_drop_pk = "ALTER TABLE %(table)s DROP PRIMARY KEY"
     sql_drop_default = "ALTER TABLE %(table)s ALTER COLUMN %(column)s DROP DEFAULT"
 
-    @property
-    def sql_create_pk(self):
-        self._reorg_tables()
-        return "ALTER TABLE %(table)s ADD CONSTRAINT %(name)s PRIMARY KEY (%(columns)s)"
+    sql_create_pk = "ALTER TABLE %(table)s ADD CONSTRAINT %(name)s PRIMARY KEY (%(columns)s)"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reorg_pending = []
+        self._holding = False
+        self._held_table = None
+        self._held = []
+        self._held_mark = 0
+        self._outer_batch = None
+
+    # Catalog metadata is read from a schema-wide snapshot for the lifetime
+    # of the editor, invalidated table by table as statements are executed.
+    # ALTER TABLE clauses are held back for as long as the editor is open.
+    def __enter__(self):
+        self.connection.introspection.start_schema_snapshot()
+        editor = super().__enter__()
+        self._holding = True
+        # An enclosing editor's held clauses go first; it holds again once
+        # this one exits.
+        self._outer_batch = self.connection.alter_batch
+        if self._outer_batch is not None:
+            self._outer_batch.flush_alters()
+        self.connection.alter_batch = self
+        return editor
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                for sql in self.deferred_sql:
+                    self.execute(sql)
+                self.deferred_sql = []
+                self.flush_alters()
+                self._reorg_tables()
+            elif not self.atomic_migration:
+                # Without a transaction to roll back, the clauses of the
+                # operations completed before the failure stay applied.
+                self.flush_alters()
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._holding = False
+            self._held_table, self._held, self._held_mark = None, [], 0
+            self.connection.alter_batch = self._outer_batch
+            self.connection.introspection.stop_schema_snapshot()
+
+    def execute(self, sql, params=()):
+        if self._holding and not params and self._hold_alter(str(sql)):
+            self._invalidate_introspection(str(sql))
+            return
+        self.flush_alters()
+        self._execute(sql, params)
+
+    def _execute(self, sql, params=()):
+        try:
+            super().execute(sql, params)
+        finally:
+            self._invalidate_introspection(str(sql))
+        match = reorg_re.match(str(sql))
+        if match and match.group(1) not in self._reorg_pending:
+            self._reorg_pending.append(match.group(1))
+
+    # Executes sql straight away, for callers that handle its failure.
+    def _execute_now(self, sql):
+        self.flush_alters()
+        self._execute(sql)
+
+    # Db2 for i rebuilds a table for every ALTER TABLE that changes it, so
+    # single-clause ALTER TABLE statements for one table are held back and
+    # sent as few multi-clause statements as possible. A clause naming a
+    # column or constraint that a held clause names goes into a later
+    # statement, as Db2 applies the ALTER COLUMN clauses of a statement before
+    # its ADD COLUMN clauses. New columns are added in the first statement
+    # they can be; other clauses, and new primary key columns, keep their
+    # order. Returns False for statements which cannot be held.
+    def _hold_alter(self, sql):
+        match = alter_clause_re.match(sql)
+        if match is None:
+            return False
+        table, clause, kind, name = match.groups()
+        if table != self._held_table:
+            self.flush_alters()
+            self._held_table = table
+        keys = {(kind.upper(), name)} if kind else set()
+        if primary_key_re.search(clause):
+            keys.add(('PRIMARY KEY', None))
+        alteration = column_alteration_re.match(clause)
+        alteration_kind = alteration.group(2).upper() if alteration else None
+
+        position = 0
+        for index, statement in enumerate(self._held):
+            for held in statement:
+                if keys & held[1]:
+                    position = index + 1
+                    last = held
+        if position and alteration and last[2] is not None and alteration_kind not in last[2] \
+                and position - 1 >= self._held_mark \
+                and self.connection.features.can_combine_column_alterations:
+            last[0] += ' ' + alteration.group(1)
+            last[2].add(alteration_kind)
+            return True
+
+        if not clause.upper().startswith('ADD COLUMN') or primary_key_re.search(clause):
+            position = max(position, self._held_mark)
+            self._held_mark = position
+        if position == len(self._held):
+            self._held.append([])
+        self._held[position].append([clause, keys, {alteration_kind} if alteration else None])
+        return True
+
+    def flush_alters(self):
+        if not self._held:
+            return
+        table, statements = self._held_table, self._held
+        self._held_table, self._held, self._held_mark = None, [], 0
+        for statement in statements:
+            self._execute("ALTER TABLE %s %s" % (table, ' '.join(held[0] for held in statement)))
+
+    # Drops what introspection knows about the table a DDL statement touched,
+    # or about every table when the statement does not name one.
+    def _invalidate_introspection(self, sql):
+        if not ddl_re.match(sql):
+            return
+        match = ddl_table_re.match(sql)
+        if match:
+            table_name = match.group(1).split('.')[-1].strip('"')
+            self.connection.introspection.invalidate_cache(table_name)
+        else:
+            self.connection.introspection.invalidate_cache()
 
     # return column definition DDL
     def column_sql(self, model, field, include_default=True):
@@ -397,6 +540,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
 
         # Need to add check constraint
         if alter_field_check_constraint and new_db_field['check']:
+            self._reorg_tables()
             self.execute(
                 self.sql_create_check % {
                     'table': self.quote_name(model._meta.db_table),
@@ -415,7 +559,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
         if alter_field_primary_key and new_field.primary_key:
             # Drop old PK if available
             try:
-                self.execute(
+                self._execute_now(
                     self.sql_drop_pk % {
                         'table': self.quote_name(model._meta.db_table)
                     }
@@ -423,6 +567,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
             except Error:
                 pass
             self.__model = model
+            self._reorg_tables()
             self.execute(
                 self.sql_create_pk % {
                     'table': self.quote_name(model._meta.db_table),
@@ -435,6 +580,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
                 new_field.model._meta.get_all_related_objects())
         # Need to add a unique constraint
         elif alter_field_unique and new_field.unique:
+            self._reorg_tables()
             self.execute(
                 self.sql_create_unique % {
                     'table': self.quote_name(model._meta.db_table),
@@ -444,6 +590,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
             )
         # Need to add a index
         elif alter_field_index and new_field.db_index:
+            self._reorg_tables()
             self.execute(
                 self.sql_create_index % {
                     'table': self.quote_name(model._meta.db_table),
@@ -468,9 +615,8 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
                 }
             )
 
-        # need to reorg table if we changed the field type of fk field
-        if len(incoming_relations) > 0:
-            self._reorg_tables()
+        # need to reorg tables whose field types changed before adding FKs
+        self._reorg_tables()
 
         # Rebuild/make FK constraint, if it have any
         if new_field.remote_field:
@@ -512,73 +658,23 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
         self.remove_field(model, old_field)
         return tmp_new_field, new_field
 
+    # The NOT NULL, primary key and unique constraints of the new column are
+    # part of its ADD COLUMN clause, so the fields added to a table share one
+    # held statement, which fails or succeeds as a whole.
     def add_field(self, model, field):
         self.__model = model
-        notnull = not field.null
-        field.null = True
-        p_key = field.primary_key
-        field.primary_key = False
-        unique = field.unique
-        field._unique = False
-
-        super().add_field(model, field)
-
-        if field.remote_field is not None and hasattr(field.remote_field, 'through'):
-            rel_condition = field.remote_field.through._meta.auto_created
-        else:
-            rel_condition = False
-
-        if isinstance(field, ManyToManyField) and rel_condition:
-            return
-        else:
+        if field.primary_key:
+            # remove other pk if available
+            for other_pk in self._constraint_names(model, primary_key=True):
+                self.execute(
+                    self.sql_delete_pk % {
+                        'table': self.quote_name(model._meta.db_table),
+                        'name': other_pk
+                    }
+                )
+        if field.primary_key or field.unique:
             self._reorg_tables()
-        sql = None
-        if notnull or unique or p_key:
-            del_column = self.sql_delete_column % {'table': self.quote_name(
-                model._meta.db_table), 'column': self.quote_name(field.column)}
-            if notnull:
-                field.null = False
-                sql = self.sql_alter_column_not_null % {
-                    'column': self.quote_name(field.column)}
-                sql = self.sql_alter_column % {'table': self.quote_name(
-                    model._meta.db_table), 'changes': sql}
-                try:
-                    self.execute(sql)
-                    self._reorg_tables()
-                except Error as e:
-                    self.execute(del_column)
-                    raise e
-            if p_key:
-                field.primary_key = True
-                cur = self.connection.cursor()
-                # remove other pk if available
-                for other_pk in cur.connection.primary_keys(True, cur.connection.get_current_schema(), model._meta.db_table):
-                    self.execute(
-                        self.sql_delete_pk % {
-                            'table': self.quote_name(model._meta.db_table),
-                            'name': other_pk['PK_NAME']
-                        }
-                    )
-                sql = self.sql_create_pk % {'table': self.quote_name(model._meta.db_table), 'name': self._create_index_name(
-                    model, [field.column], suffix="_pk"), 'columns': self.quote_name(field.column)}
-                try:
-                    self.execute(sql)
-                    self._reorg_tables()
-                except Error as e:
-                    self.execute(del_column)
-                    raise e
-            elif unique:
-                field._unique = True
-                constraint_name = self._create_index_name(
-                    model, [field.column], suffix="_uniq")
-                sql = self.sql_create_unique % {'table': self.quote_name(
-                    model._meta.db_table), 'name': constraint_name, 'columns': self.quote_name(field.column)}
-                try:
-                    self.execute(sql)
-                    self._reorg_tables()
-                except Error as e:
-                    self.execute(del_column)
-                    raise e
+        super().add_field(model, field)
 
     def alter_db_table(self, model, old_db_table, new_db_table):
         super().alter_db_table(model, old_db_table, new_db_table)
@@ -619,20 +715,19 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
             self._restore_constraints_check(
                 deferred_constraints, rel_old_field, rel_new_field, new_field.rel.through)
 
+    # Reorganises the tables this editor left reorg pending, each once.
+    # Constraints cannot be added to a reorg pending table, so this also runs
+    # ahead of steps that add them; Db2 for i never needs it.
     def _reorg_tables(self):
-        checkReorgSQL = "select TABSCHEMA, TABNAME from SYSIBMADM.ADMINTABINFO where REORG_PENDING = 'Y'"
-        res = []
-        reorgSQLs = []
-        with self.connection.cursor() as cursor:
-            cursor.execute(checkReorgSQL)
-            res = cursor.fetchall()
-        if res:
-            for sName, tName in res:
-                reorgSQL = '''CALL SYSPROC.ADMIN_CMD('REORG TABLE "%(sName)s"."%(tName)s"')''' % {
-                    'sName': sName, 'tName': tName}
-                reorgSQLs.append(reorgSQL)
-        for sql in reorgSQLs:
-            self.execute(sql)
+        if not self._reorg_pending and not self._held:
+            return
+        if not self.connection.features.requires_table_reorg:
+            self._reorg_pending = []
+            return
+        self.flush_alters()
+        tables, self._reorg_pending = self._reorg_pending, []
+        for table in tables:
+            self.execute("CALL SYSPROC.ADMIN_CMD('REORG TABLE %s')" % table)
 
     def _defer_constraints_check(self, constraints, deferred_constraints, old_field, new_field, model, defer_pk=False,
                                  defer_unique=False, defer_index=False, defer_check=False):
@@ -647,7 +742,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
             if defer_unique and constr_dict['unique'] is True:
                 if old_field.column in constr_dict['columns']:
                     try:
-                        self.execute(self.sql_delete_unique % {
+                        self._execute_now(self.sql_delete_unique % {
                             'table': model._meta.db_table,
                             'name': constr_name})
                         deferred_constraints['unique'][constr_name] = constr_dict['columns']
@@ -676,6 +771,7 @@ class DB2SchemaEditor(BaseDatabaseSchemaEditor):
 
     def _restore_constraints_check(self, deferred_constraints, old_field, new_field, model):
         self.__model = model
+        self._reorg_tables()
         for pk_name, columns in deferred_constraints['pk'].items():
             self.execute(self.sql_create_pk % {
                 'table': model._meta.db_table,
@@ -0,0 +1,200 @@
+# +--------------------------------------------------------------------------+
+# |  Licensed Materials - Property of IBM                                    |
+# |                                                                          |
+# | (C) Copyright IBM Corporation 2009-2018.                                 |
+# +--------------------------------------------------------------------------+
+# | This module complies with Django 1.0 and is                              |
+# | Licensed under the Apache License, Version 2.0 (the "License");          |
+# | you may not use this file except in compliance with the License.         |
+# | You may obtain a copy of the License at                                  |
+# | http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable |
+# | law or agreed to in writing, software distributed under the License is   |
+# | distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY |
+# | KIND, either express or implied. See the License for the specific        |
+# | language governing permissions and limitations under the License.        |
+# +--------------------------------------------------------------------------+
+
+"""
+Helper classes shared by the DB2 backend modules.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+
+    """
+    Bounded, thread safe least-recently-used mapping which keeps hit, miss
+    and eviction counters so the cache behaviour can be inspected at runtime.
+    on_evict, when given, is called with each evicted key and value.
+    """
+
+    def __init__(self, maxsize=1024, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    # Returns the cached value for key, or default when it is not cached.
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # Stores value under key, evicting the least recently used entries
+    # once the cache is full.
+    def put(self, key, value):
+        evicted = []
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+                self.evictions += 1
+        if self.on_evict is not None:
+            for item in evicted:
+                self.on_evict(*item)
+
+    # Removes key from the cache, if it is present.
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # Removes key from the cache and returns its value, or default when it
+    # is not cached.
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+class IntrospectionCache:
+
+    """
+    Catalog metadata keyed by (schema, table, kind). Entries expire after
+    ttl seconds (never when ttl is None), and a ttl of 0 disables caching
+    except while the cache is held. A table of None holds schema level
+    entries such as the table list.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._data = {}
+        self._holds = 0
+
+    @property
+    def enabled(self):
+        return self.ttl != 0 or self._holds > 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, stored = entry
+        if not self._holds and self.ttl is not None and time.monotonic() - stored > self.ttl:
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        if self.enabled:
+            self._data[key] = (value, time.monotonic())
+
+    # While held, as for the lifetime of a schema editor which invalidates
+    # what it changes, entries are kept whatever the ttl. Holds nest; with a
+    # ttl of 0 the last release empties the cache.
+    def hold(self):
+        self._holds += 1
+
+    def release(self):
+        self._holds -= 1
+        if not self._holds and self.ttl == 0:
+            self._data.clear()
+
+    # Forgets everything cached about table_name, along with the table lists
+    # that may name it. Without a table name the cache is emptied.
+    def invalidate(self, table_name=None):
+        if table_name is None:
+            self._data.clear()
+            return
+        table_name = table_name.lower()
+        for key in list(self._data):
+            if key[1] == table_name or key[2] == 'tables':
+                del self._data[key]
+
+
+class StatementCache:
+
+    """
+    Per-connection cache of pyodbc cursors keyed by SQL text. A cursor keeps
+    the statement it last executed prepared, so running the same SQL on it
+    again skips the prepare. Cursors are checked out while in use and checked
+    back in once their results are no longer needed.
+    """
+
+    def __init__(self, connection, maxsize=32):
+        self.connection = connection
+        self._cursors = LRUCache(maxsize, on_evict=self._close)
+
+    def checkout(self, sql):
+        cursor = self._cursors.pop(sql)
+        if cursor is None:
+            cursor = self.connection.cursor()
+        return cursor
+
+    # Closes the result set still open on cursor, keeping the statement
+    # prepared, and makes the cursor available to the next execution of sql.
+    def checkin(self, sql, cursor):
+        try:
+            while cursor.nextset():
+                pass
+        except Exception:
+            self._close(sql, cursor)
+            return
+        previous = self._cursors.pop(sql)
+        self._cursors.put(sql, cursor)
+        if previous is not None and previous is not cursor:
+            self._close(sql, previous)
+
+    def stats(self):
+        return self._cursors.stats()
+
+    def _close(self, sql, cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
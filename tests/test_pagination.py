@@ -0,0 +1,100 @@
+import datetime
+import decimal
+import unittest
+import uuid
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(SECRET_KEY='django_ibmi-tests', USE_TZ=True)
+django.setup()
+
+from django.db import models  # noqa: E402
+from django.db.models import F, Q  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from django_ibmi.pagination import InvalidToken, KeysetPaginator  # noqa: E402
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'django_ibmi_tests'
+
+
+class Book(models.Model):
+    title = models.CharField(max_length=50)
+    created = models.DateTimeField()
+    author = models.ForeignKey(Author, models.CASCADE)
+
+    class Meta:
+        app_label = 'django_ibmi_tests'
+        ordering = ['title']
+
+
+def paginator(*names):
+    paginator = KeysetPaginator.__new__(KeysetPaginator)
+    paginator.keys = [(name, name, False) for name in names]
+    return paginator
+
+
+class TokenTests(unittest.TestCase):
+
+    def test_sub_millisecond_values_round_trip(self):
+        row = {
+            'created': datetime.datetime(2020, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+            'starts': datetime.time(12, 30, 45, 999999),
+            'day': datetime.date(2020, 1, 2),
+            'amount': decimal.Decimal('10.000001'),
+            'ref': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'id': 42,
+        }
+        keyset = paginator(*row)
+        self.assertEqual(keyset._decode(keyset._encode(row)), list(row.values()))
+
+    def test_tampered_token(self):
+        keyset = paginator('id')
+        token = keyset._encode({'id': 1})
+        with self.assertRaises(InvalidToken):
+            keyset._decode(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+
+    def test_token_for_other_ordering(self):
+        token = paginator('id')._encode({'id': 1})
+        with self.assertRaises(InvalidToken):
+            paginator('created', 'id')._decode(token)
+
+
+class OrderingTests(unittest.TestCase):
+
+    def test_pk_is_appended_as_tie_breaker(self):
+        keyset = KeysetPaginator(Book.objects.all(), 10)
+        self.assertEqual(keyset.ordering, ['title', 'pk'])
+        self.assertEqual(keyset._seek_filter(['b', 3]), Q(title__gt='b') | (Q(id__gt=3) & Q(title='b')))
+
+    def test_mixed_directions(self):
+        keyset = KeysetPaginator(Book.objects.all(), 10, ordering=['-created', 'title', '-id'])
+        self.assertEqual(keyset.ordering, ['-created', 'title', '-id'])
+        self.assertEqual(
+            keyset._seek_filter(['c', 't', 7]),
+            Q(created__lt='c') |
+            (Q(title__gt='t') & Q(created='c')) |
+            (Q(id__lt=7) & Q(created='c') & Q(title='t')),
+        )
+
+    def test_foreign_key_is_compared_by_value(self):
+        keyset = KeysetPaginator(Book.objects.all(), 10, ordering=['author'])
+        self.assertEqual(keyset.keys[0], ('author', 'author_id', False))
+
+    def test_expression_ordering_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'field names only'):
+            KeysetPaginator(Book.objects.all(), 10, ordering=[F('created').desc()])
+
+    def test_related_lookup_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'author__name'):
+            KeysetPaginator(Book.objects.all(), 10, ordering=['author__name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from unittest import mock
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(SECRET_KEY='django_ibmi-tests', USE_TZ=True)
+
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+if pyodbc is not None:
+    from django_ibmi import pool as pool_module  # noqa: E402
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        self.connection.log.append(sql)
+        return self
+
+    def fetchall(self):
+        return [('QGPL',)]
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.log = []
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+    def set_attr(self, attribute, value):
+        self.log.append('SET_ATTR')
+
+    def close(self):
+        self.log.append('CLOSE')
+
+
+@unittest.skipIf(pyodbc is None, "pyodbc is not available")
+class ResetTests(unittest.TestCase):
+
+    def borrow(self, **options):
+        pool = pool_module.ConnectionPool(**options)
+        connection = pool.acquire(FakeConnection)
+        connection.autocommit = True
+        connection.log.clear()
+        return pool, connection
+
+    def test_unchanged_connection_costs_no_round_trip(self):
+        pool, connection = self.borrow()
+        pool.release(connection)
+        self.assertEqual(connection.log, [])
+
+    def test_open_transaction_is_rolled_back(self):
+        pool, connection = self.borrow()
+        connection.autocommit = False
+        pool.release(connection)
+        self.assertEqual(connection.log, ['ROLLBACK'])
+
+    def test_only_changed_settings_are_reset(self):
+        pool, connection = self.borrow()
+        pool.changed(connection, 'schema')
+        pool.release(connection)
+        self.assertEqual(connection.log, ["SET SCHEMA 'QGPL'"])
+        connection = pool.acquire(FakeConnection)
+        connection.log.clear()
+        pool.changed(connection, 'isolation')
+        pool.release(connection)
+        self.assertEqual(connection.log, ['SET_ATTR'])
+
+
+@unittest.skipIf(pyodbc is None, "pyodbc is not available")
+class ForkTests(unittest.TestCase):
+
+    def forked(self, pool):
+        return mock.patch.object(pool_module.os, 'getpid', return_value=pool._pid + 1)
+
+    def test_inherited_connections_are_left_alone(self):
+        pool = pool_module.ConnectionPool(min_size=1)
+        borrowed = pool.acquire(FakeConnection)
+        idle = pool.acquire(FakeConnection)
+        pool.release(idle)
+        borrowed.log.clear()
+        idle.log.clear()
+        with self.forked(pool):
+            pool.release(borrowed)
+            pool.close()
+        self.assertEqual(borrowed.log, [])
+        self.assertEqual(idle.log, [])
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_child_opens_its_own_connections(self):
+        pool = pool_module.ConnectionPool()
+        inherited = pool.acquire(FakeConnection)
+        pool.release(inherited)
+        with self.forked(pool):
+            connection = pool.acquire(FakeConnection)
+            self.assertIsNot(connection, inherited)
+            pool.release(connection)
+        self.assertIn('ROLLBACK', connection.log)
+
+    def test_unknown_connection_is_closed(self):
+        pool = pool_module.ConnectionPool()
+        connection = FakeConnection()
+        pool.release(connection)
+        self.assertEqual(connection.log, ['CLOSE'])
+
+
+if __name__ == '__main__':
+    unittest.main()